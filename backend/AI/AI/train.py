@@ -1,13 +1,15 @@
-﻿import os, re, io, sys, glob, mmap, time, html, random, string, joblib, unicodedata, json
-import numpy as np, pandas as pd
+﻿import os, re, io, sys, glob, math, mmap, time, html, zlib, random, joblib, unicodedata, json, argparse
+import hashlib, itertools, multiprocessing, shutil
+import numpy as np, pandas as pd, scipy.sparse as sp
 from datetime import datetime
-from urllib.parse import urlparse, quote
+from urllib.parse import urlparse
 from sklearn.feature_extraction.text import HashingVectorizer
 from sklearn.linear_model import SGDClassifier
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.decomposition import TruncatedSVD
 from sklearn.ensemble import IsolationForest
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 
 # UTF-8 stdout
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -20,6 +22,7 @@ os.makedirs(LOG_DIR, exist_ok=True)
 BASE_MODEL_PATH = os.path.join(BASE_DIR, "sgd_model.pkl")
 CAL_MODEL_PATH = os.path.join(BASE_DIR, "calibrated_model.pkl")
 IFOREST_MODEL_PATH = os.path.join(BASE_DIR, "iforest_model.pkl")
+MODEL_BUNDLE_DIR = os.path.join(BASE_DIR, "model_bundle")
 
 # ========= 정규화 =========
 _SQL_COMMENTS_RE = re.compile(r"(--[^\r\n]*|/\*.*?\*/|#[^\r\n]*)", re.DOTALL|re.IGNORECASE)
@@ -38,8 +41,18 @@ def multi_unquote(s: str, rounds: int = 3) -> str:
         x = y
     return x
 
+# 정규화의 어떤 단계도 바꿀 수 없는 입력 판별: 출력 가능 ASCII(0x20~0x7E)만 있고 %, &, #, --, /* 가 없으면
+# NFKC/동형문자 치환/unquote/unescape/주석 제거/제어문자 치환이 모두 항등이므로 공백 정리와 소문자화만 하면 된다.
+_NEEDS_FULL_CANON_RE = re.compile(r"[^\x20-\x7e]|[%&#]|--|/\*")
+
 def canonicalize(s: str) -> str:
     if not s: return ""
+    if not _NEEDS_FULL_CANON_RE.search(s):
+        if "  " in s: s = _HTML_TAG_WS_RE.sub(" ", s)
+        return s.strip().lower()
+    return _canonicalize_full(s)
+
+def _canonicalize_full(s: str) -> str:
     s = unicodedata.normalize("NFKC", s).translate(HOMO)
     s = multi_unquote(s, 3)
     s = html.unescape(s)
@@ -119,116 +132,683 @@ def parse_and_label_jsonl(line: str):
     except (json.JSONDecodeError, AttributeError):
         return None, None
 
-def iter_lines_mmap(filepath):
+def iter_lines_mmap(filepath, start=0, end=None):
+    """[start, end) 바이트 구간에서 시작하는 라인들을 생성 (start는 라인 경계여야 함)"""
     with open(filepath,'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0: return
         mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-        for raw in iter(mm.readline, b""):
+        end = len(mm) if end is None else min(end, len(mm))
+        mm.seek(start)
+        while mm.tell() < end:
+            raw = mm.readline()
             if not raw: break
             yield raw.decode('utf-8', errors='ignore').strip()
         mm.close()
 
+def split_file_ranges(filepath, n_shards, min_shard_bytes=1 << 20):
+    """파일을 개행 경계에 맞춘 [start, end) 바이트 구간들로 분할"""
+    size = os.path.getsize(filepath)
+    if size == 0: return []
+    n_shards = max(1, min(n_shards, size // max(1, min_shard_bytes)))
+    bounds = [0]
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for k in range(1, n_shards):
+            nl = mm.find(b"\n", max(bounds[-1], size * k // n_shards))
+            if nl < 0: break
+            if nl + 1 < size: bounds.append(nl + 1)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+# ========= 규칙 엔진 =========
+# 클래스별 패턴(strict + fuzzy)을 하나의 정규식으로 합치고, 값싼 리터럴 사전 필터로
+# 어떤 패턴도 매치될 수 없는 입력(대부분의 정상 요청)은 정규식을 아예 실행하지 않는다.
+# 규칙 ID는 "<클래스>:<strict|fuzzy>:<인덱스>" 형식 (예: "xss_attack:strict:3").
+_FUZZY_JUNK_LITERALS = ("%", "\\", "/*")   # fuzzy_keyword의 junk 그룹이 매치되려면 필요한 문자열
+
+# 클래스의 패턴이 하나라도 매치되려면 canonicalize 결과에 반드시 들어 있어야 하는 리터럴 (하나 이상)
+# canonicalize는 소문자로 바꾸고 공백을 한 칸으로 합치므로, ASCII 입력에 한해 이 조건은 필요조건이다.
+RULE_PREFILTER_LITERALS = {
+    "xss_attack": ("<", "on", ":", "&#", "(", "document.", "window.location", "storage", "@import",
+                   "{{", "#{") + _FUZZY_JUNK_LITERALS,
+    "sql_injection": ("select", "insert", "update", "delete", "drop", "create", "truncate", "union",
+                      "--", "#", "1=", "1 =", " or ", " and ", "schema", "mysql.user", "pg_catalog",
+                      "sysobjects", "v$version", "(", "into", "load_file", "exec", "xp_cmdshell", "0x",
+                      "[$", "$where", "following-sibling", "ancestor-or-self") + _FUZZY_JUNK_LITERALS,
+}
+
+RULE_IDS = {k: [f"{k}:strict:{i}" for i in range(len(RAW_STRICT[k]))] +
+               [f"{k}:fuzzy:{i}" for i in range(len(RAW_FUZZY[k]))] for k in RAW_STRICT}
+_RULE_PATTERNS = {k: PAT_STRICT[k] + PAT_FUZZY[k] for k in RAW_STRICT}
+_RULE_COMBINED = {k: re.compile("|".join(f"(?:{p})" for p in RAW_STRICT[k] + RAW_FUZZY[k]), re.IGNORECASE|re.DOTALL)
+                  for k in RAW_STRICT}
+_RULE_PREFILTER = {k: re.compile("|".join(re.escape(t) for t in v)) for k, v in RULE_PREFILTER_LITERALS.items()}
+
+# 규칙 단계 한도 (ReDoS 방어): asdfg.py와 같은 길이 한도·클래스별 시간 예산·창 단위 검사. 학습 라벨이 분석 판정과
+# 같아야 하므로 두 파일의 값과 동작을 함께 바꿀 것 (자세한 설명은 asdfg.py의 "규칙 단계 시간 예산").
+# 길이 한도를 넘은 입력은 창 단위로 끝까지 검사하므로 규칙이 없으면 normal이다. 시간 예산에 걸려 검사를 끝내지 못했는데
+# 아무 규칙도 걸리지 않은 라인은 라벨을 정할 수 없으므로(분석기에서는 대체 판정) 학습에서 뺀다.
+RULE_MAX_INPUT_LEN = 2048
+RULE_SLOW_PATH_LEN = 256
+RULE_CLASS_BUDGET_MS = 20.0
+
+def _is_linear_pattern(raw):
+    """무제한 반복(*, +, {n,})이 \s에만 붙은 패턴인지. canonicalize가 공백을 한 칸으로 합치므로 입력 길이에 선형"""
+    return not re.search(r"[*+]|\{\d+,\}", re.sub(r"\\s[*+]\??|\\.", "", raw))
+
+_RULE_LINEAR = {k: [_is_linear_pattern(p) for p in RAW_STRICT[k] + RAW_FUZZY[k]] for k in RAW_STRICT}
+_RULE_BUDGET_ORDER = {k: sorted(range(len(v)), key=lambda i, v=v: not v[i]) for k, v in _RULE_LINEAR.items()}
+
+class RuleBudgetExceeded(Exception):
+    def __init__(self, cls, rules):
+        super().__init__(cls, rules)
+        self.cls, self.rules = cls, rules
+
+def _match_rule_class(cls, text, deadline=None, linear=None):
+    """text에 매치되는 cls 클래스의 규칙 ID 목록 (없으면 빈 리스트).
+    deadline(perf_counter 기준)이 있으면 패턴별로 평가하고, 넘으면 RuleBudgetExceeded.
+    linear가 True/False면 선형/역추적 패턴만 평가 (deadline 필요)."""
+    if text.isascii() and not _RULE_PREFILTER[cls].search(text): return []
+    if deadline is None:
+        if not _RULE_COMBINED[cls].search(text): return []
+        # 양성인 경우에만 개별 패턴을 돌려 어떤 규칙이 걸렸는지 기록
+        return [rid for rid, rgx in zip(RULE_IDS[cls], _RULE_PATTERNS[cls]) if rgx.search(text)]
+    hits, ids = [], RULE_IDS[cls]
+    for i in _RULE_BUDGET_ORDER[cls]:
+        if linear is not None and _RULE_LINEAR[cls][i] != linear: continue
+        if time.perf_counter() > deadline: raise RuleBudgetExceeded(cls, [ids[j] for j in sorted(hits)])
+        if _RULE_PATTERNS[cls][i].search(text): hits.append(i)
+    return [ids[i] for i in sorted(hits)]
+
+def _windows(text, size):
+    """size 길이 창을 절반씩 겹쳐 가며 생성 (text가 size 이하면 그대로 하나)"""
+    if len(text) <= size:
+        yield text
+        return
+    step = size // 2
+    for start in range(0, len(text) - size + step, step):
+        yield text[start:start + size]
+
+def _canonicalize_light(s: str) -> str:
+    """canonicalize에서 주석 제거만 뺀 정규화. 입력 길이에 선형 (긴 입력의 선형 패턴 검사용)"""
+    s = unicodedata.normalize("NFKC", s).translate(HOMO)
+    s = html.unescape(multi_unquote(s, 3))
+    s = _PCT_WS_RE.sub(" ", s)
+    s = _WHITESPACE_RE.sub(" ", s)
+    s = _HTML_TAG_WS_RE.sub(" ", s)
+    return s.strip().lower()
+
+_COMMENT_MARK_RE = re.compile(r"--|/\*|#")   # _SQL_COMMENTS_RE가 매치되려면 필요한 표시
+
+def _match_oversize(cls, raw, deadline):
+    """RULE_MAX_INPUT_LEN을 넘는 입력: 선형 패턴은 전체에, 역추적 패턴은 창마다 (첫 매치 창까지)"""
+    light = _canonicalize_light(raw)
+    rules = _match_rule_class(cls, light, deadline, linear=True)
+    if rules: return rules
+    if not _COMMENT_MARK_RE.search(light):   # 주석 제거가 항등 → light == canonicalize(raw)
+        for text in _windows(light, RULE_MAX_INPUT_LEN):
+            rules = _match_rule_class(cls, text, deadline, linear=False)
+            if rules: return rules
+        return []
+    for raw_window in _windows(raw, RULE_MAX_INPUT_LEN):
+        if time.perf_counter() > deadline: raise RuleBudgetExceeded(cls, [])
+        for text in _windows(canonicalize(raw_window), RULE_MAX_INPUT_LEN):
+            rules = _match_rule_class(cls, text, deadline)
+            if rules: return rules
+    return []
+
+def _check_rule_class(cls, raw):
+    """(raw에 대한 cls 규칙 ID 목록, 시간 예산 초과 여부)"""
+    if not raw: return [], False
+    deadline = time.perf_counter() + RULE_CLASS_BUDGET_MS / 1000   # 클래스마다 새 예산
+    try:
+        if len(raw) <= RULE_MAX_INPUT_LEN:
+            text = canonicalize(raw)
+            if len(text) <= RULE_MAX_INPUT_LEN:
+                return _match_rule_class(cls, text, deadline if len(text) > RULE_SLOW_PATH_LEN else None), False
+        return _match_oversize(cls, raw, deadline), False
+    except RuleBudgetExceeded as e:
+        return e.rules, True
+
+def rule_based_match(path, query):
+    """(라벨, 매치된 규칙 ID 목록) 반환. 라벨 판정 순서는 XSS(전체 URL) → SQLi(query).
+    시간 예산에 걸려 규칙 없이 검사를 끝내지 못하면 라벨은 None (학습에서 제외)."""
+    path, query = path or "", query or ""
+    rules, cut = _check_rule_class("xss_attack", path + (("?" + query) if query else ""))
+    if rules: return "xss_attack", rules
+    sql_rules, sql_cut = _check_rule_class("sql_injection", query)
+    if sql_rules: return "sql_injection", sql_rules
+    return (None if cut or sql_cut else "normal"), []
+
 def rule_based_label(path, query):
-    full = canonicalize((path or "") + (("?" + query) if query else ""))
-    for rgx in PAT_STRICT["xss_attack"]:
-        if rgx.search(full): return "xss_attack"
-    for rgx in PAT_FUZZY["xss_attack"]:
-        if rgx.search(full): return "xss_attack"
-    q = canonicalize(query or "")
-    if q:
-        for rgx in PAT_STRICT["sql_injection"]:
-            if rgx.search(q): return "sql_injection"
-        for rgx in PAT_FUZZY["sql_injection"]:
-            if rgx.search(q): return "sql_injection"
-    return "normal"
+    return rule_based_match(path, query)[0]
 
-# ========= 학습 파이프라인 =========
-if __name__ == '__main__':
-    print("🚀 AI 모델 학습을 시작합니다...")
-    
-    log_files = glob.glob(os.path.join(LOG_DIR, '*.log')) + \
-                glob.glob(os.path.join(LOG_DIR, '*.json')) + \
-                glob.glob(os.path.join(LOG_DIR, '*.jsonl'))
+# ========= 학습 데이터 수집 =========
+# partial_fit은 첫 배치에서 전체 클래스 목록을 알아야 하므로 고정 (np.unique 순서와 동일)
+CLASSES = np.array(["normal", "sql_injection", "xss_attack"])
+LABEL_CODES = {c: i for i, c in enumerate(CLASSES.tolist())}   # 워커 → 부모 전달/캐시 저장용 uint8 라벨 코드
+_CLASS_NAMES = tuple(CLASSES.tolist())
+MAX_SAMPLES_FOR_TRAINING = 200_000
+STREAM_BATCH_SIZE = 10_000
+# 스트리밍 모드에서 SGD 학습에 쓰지 않고 확률 보정용으로 떼어 두는 비율(%). URL 해시로 나누므로 같은 URL은 항상 같은 쪽에 들어간다.
+CALIBRATION_HOLDOUT_PCT = 10
 
-    if not log_files:
-        print(f"❌ '{LOG_DIR}'에서 처리할 로그 파일을 찾을 수 없습니다. 학습을 중단합니다.")
-        sys.exit(1)
+def find_log_files(log_dir=LOG_DIR):
+    # 파일 순서가 샘플링 결과에 영향을 주므로 정렬 (--seed 재현성)
+    return sorted(glob.glob(os.path.join(log_dir, '*.log')) +
+                  glob.glob(os.path.join(log_dir, '*.json')) +
+                  glob.glob(os.path.join(log_dir, '*.jsonl')))
 
-    print(f"📄 총 {len(log_files)}개의 로그 파일을 사용합니다.")
-    all_texts, all_labels = [], []
+def iter_labeled_file(fp, start=0, end=None, stats=None):
+    """로그 파일(또는 [start, end) 구간)을 파싱/라벨링하여 (URL, 라벨)을 순서대로 생성.
+    stats(Counter)가 주어지면 라인/건너뜀/라벨별 개수를 누적한다."""
+    is_jsonl = fp.endswith('.jsonl')
+    for line in iter_lines_mmap(fp, start, end):
+        if stats is not None: stats["lines"] += 1
+        if is_jsonl:
+            rec, lbl = parse_and_label_jsonl(line)
+            if not rec: # 파싱 실패 시 건너뛰기
+                if stats is not None: stats["skipped"] += 1
+                continue
+        else: # 기존 .log, .json 파일 처리
+            path, query = parse_line(line)
+            if not path and not query:
+                if stats is not None: stats["skipped"] += 1
+                continue
+            rec = (path or "") + (('?' + query) if query else '')
+            lbl = rule_based_label(path, query)
+            if lbl is None: # 규칙 시간 예산 초과로 라벨을 정하지 못함
+                if stats is not None: stats["skipped"] += 1; stats["rule_budget"] += 1
+                continue
+        if stats is not None: stats[lbl] += 1
+        yield rec, lbl
+
+def holdout_bucket(rec):
+    """0~99 버킷. CALIBRATION_HOLDOUT_PCT 미만이면 보정용 홀드아웃."""
+    return zlib.crc32(rec.encode('utf-8', errors='ignore')) % 100
+
+def print_file_stats(fp, stats):
+    labels = ", ".join(f"{c} {stats[c]:,}" for c in _CLASS_NAMES if stats[c])
+    budget = f" (규칙 시간 초과 {stats['rule_budget']:,})" if stats['rule_budget'] else ""
+    print(f"    ↳ {os.path.basename(fp)}: 라인 {stats['lines']:,} / 건너뜀 {stats['skipped']:,}{budget} / {labels or '라벨 없음'}"
+          f" ({stats['seconds']:.1f}s)")
+
+# ========= 특성 캐시 =========
+# 로그 파일별 해시 특성(CSR)·라벨 코드·홀드아웃 버킷을 "<로그 파일>.features/" 디렉터리에 수집 청크 단위로 저장한다.
+#   part-NNNNN.npz   청크 하나 (scipy.sparse.load_npz로도 읽을 수 있는 형식 + labels/holdout_bucket 배열)
+#   meta.json        캐시 키, 청크 수, 파일 통계. 모든 청크를 쓴 뒤 마지막에 기록하므로 meta.json이 있으면 완전한 캐시다.
+# 만들 때도 읽을 때도 청크 하나씩만 메모리에 올리므로 로그 크기와 무관하게 메모리 사용량이 일정하다.
+# 키 = 파일 내용 SHA-256 + 벡터라이저/규칙 설정. 크기와 mtime이 저장 당시와 같으면 내용 해시 재계산은 생략한다.
+# 파싱/정규화/라벨링 로직을 바꾸면 FEATURE_CACHE_VERSION을 올려 기존 캐시를 무효화할 것.
+FEATURE_CACHE_VERSION = 2
+FEATURE_CACHE_SUFFIX = ".features"
+_LEGACY_FEATURE_CACHE_SUFFIX = ".features.npz"   # 버전 1의 파일 하나짜리 캐시 (새 캐시를 만들 때 삭제)
+
+def feature_config_key():
+    cfg = {"version": FEATURE_CACHE_VERSION, "vectorizer": vec.get_params(), "classes": _CLASS_NAMES,
+           "strict": RAW_STRICT, "fuzzy": RAW_FUZZY,
+           "rule_limits": [RULE_MAX_INPUT_LEN, RULE_SLOW_PATH_LEN, RULE_CLASS_BUDGET_MS]}
+    return hashlib.sha256(json.dumps(cfg, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def file_sha256(fp):
+    h = hashlib.sha256()
+    with open(fp, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def feature_cache_path(fp):
+    return fp + FEATURE_CACHE_SUFFIX
+
+def _feature_cache_part(cache_dir, k):
+    return os.path.join(cache_dir, f"part-{k:05d}.npz")
+
+def feature_cache_meta(fp, config_key):
+    """로그를 읽기 전에 기록해 두는 캐시 키 정보"""
+    st = os.stat(fp)
+    return {"config": config_key, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(fp)}
+
+def read_feature_cache_meta(fp, config_key):
+    """유효한 캐시의 meta (없거나 키가 다르면 None)"""
+    path = feature_cache_path(fp)
+    try:
+        with open(os.path.join(path, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        if not all(os.path.isfile(_feature_cache_part(path, k)) for k in range(meta["parts"])):
+            raise FileNotFoundError("청크 파일 누락")
+    except FileNotFoundError as e:
+        if os.path.isdir(path): print(f"⚠️ 특성 캐시 손상 → 다시 생성: {path} ({e})")
+        return None
+    except Exception as e:
+        print(f"⚠️ 특성 캐시 손상 → 다시 생성: {path} ({e})")
+        return None
+    st = os.stat(fp)
+    if meta.get("config") != config_key or meta.get("size") != st.st_size:
+        return None
+    return meta if meta.get("mtime_ns") == st.st_mtime_ns or meta.get("sha256") == file_sha256(fp) else None
+
+def iter_feature_cache(fp, meta, stats=None):
+    """캐시된 청크들을 (X, 라벨 코드, 홀드아웃 버킷)으로 하나씩 읽는다. stats가 주어지면 읽기 시간을 누적한다."""
+    path = feature_cache_path(fp)
+    for k in range(meta["parts"]):
+        t0 = time.time()
+        with np.load(_feature_cache_part(path, k), allow_pickle=False) as z:
+            part = (sp.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"])),
+                    z["labels"], z["holdout_bucket"])
+        if stats is not None: stats["seconds"] += time.time() - t0
+        yield part
+
+class FeatureCacheWriter:
+    """수집 청크를 도착하는 대로 임시 디렉터리에 쓰고, 파일을 다 읽으면 meta.json을 기록한 뒤 캐시 디렉터리로 교체.
+    쓰기에 실패하면 경고만 남기고 그 파일의 캐시 저장을 포기한다 (학습은 계속)."""
+    def __init__(self, fp, meta):
+        self.fp, self.meta, self.parts = fp, meta, 0
+        self.path = feature_cache_path(fp)
+        self.tmp = f"{self.path}.tmp{os.getpid()}"
+        try:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            os.makedirs(self.tmp)
+        except OSError as e:
+            self._fail(e)
+
+    def _fail(self, e):
+        print(f"⚠️ 특성 캐시 저장 실패: {self.path} ({e})")
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        self.tmp = None
+
+    def add(self, X, codes, buckets):
+        if self.tmp is None: return
+        try:
+            with open(_feature_cache_part(self.tmp, self.parts), 'wb') as f:
+                np.savez_compressed(f, format=np.array('csr'), shape=np.array(X.shape), data=X.data, indices=X.indices,
+                                    indptr=X.indptr, labels=codes, holdout_bucket=buckets)
+            self.parts += 1
+        except OSError as e:
+            self._fail(e)
+
+    def finish(self, stats):
+        if self.tmp is None: return
+        st = os.stat(self.fp)
+        if (st.st_size, st.st_mtime_ns) != (self.meta["size"], self.meta["mtime_ns"]):
+            print(f"⚠️ 읽는 도중 로그가 변경되어 특성 캐시를 저장하지 않음: {os.path.basename(self.fp)}")
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            return
+        try:
+            with open(os.path.join(self.tmp, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump(dict(self.meta, parts=self.parts, stats=dict(stats)), f)
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(self.tmp, self.path)
+            if os.path.isfile(self.fp + _LEGACY_FEATURE_CACHE_SUFFIX): os.remove(self.fp + _LEGACY_FEATURE_CACHE_SUFFIX)
+        except OSError as e:
+            self._fail(e)
+
+# ========= 병렬 수집(파싱/라벨링/벡터화) =========
+# 큰 파일은 INGEST_CHUNK_BYTES 단위 청크로 나눠 워커에 분배하고, 결과는 원래 순서대로 소비한다.
+# 워커는 URL 문자열 대신 (CSR 특성, uint8 라벨 코드, uint8 홀드아웃 버킷, 통계)만 돌려준다.
+INGEST_CHUNK_BYTES = 8 << 20   # 8MB
+INGEST_INFLIGHT_PER_JOB = 2    # 워커당 동시에 대기시키는 청크 수 (부모가 느려도 결과가 메모리에 쌓이지 않도록)
+
+def _ingest_chunk(fp, start, end):
+    stats, t0 = Counter(), time.time()
+    texts, codes = [], bytearray()
+    for rec, lbl in iter_labeled_file(fp, start, end, stats):
+        texts.append(rec)
+        codes.append(LABEL_CODES[lbl])
+    buckets = np.fromiter(map(holdout_bucket, texts), dtype=np.uint8, count=len(texts))
+    X = vec.transform(texts) if texts else sp.csr_matrix((0, vec.n_features))
+    stats["seconds"] = time.time() - t0
+    return X, np.frombuffer(bytes(codes), dtype=np.uint8), buckets, stats
+
+def _iter_chunk_results(tasks, jobs):
+    if jobs <= 1:
+        for task in tasks:
+            yield _ingest_chunk(*task)
+        return
+    methods = multiprocessing.get_all_start_methods()
+    mp_context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context) as pool:
+        it = iter(tasks)
+        pending = deque(pool.submit(_ingest_chunk, *t) for t in itertools.islice(it, jobs * INGEST_INFLIGHT_PER_JOB))
+        while pending:
+            result = pending.popleft().result()
+            pending.extend(pool.submit(_ingest_chunk, *t) for t in itertools.islice(it, 1))
+            yield result
+
+def iter_feature_chunks(log_files, jobs=1, use_cache=True, verbose=True):
+    """로그 파일 순서대로 (X, 라벨 코드, 홀드아웃 버킷) 청크를 생성.
+    유효한 특성 캐시가 있는 파일은 로그 대신 캐시를 읽고, 나머지는 (jobs > 1이면 워커들이 나눠) 파싱/라벨링/벡터화한 뒤 캐시를 저장한다."""
+    config_key = feature_config_key() if use_cache else None
+    plans = []
     for fp in log_files:
-        print(f"  - 처리 중: {os.path.basename(fp)}")
-        
-        is_jsonl = fp.endswith('.jsonl')
-
-        for line in iter_lines_mmap(fp):
-           
-            if is_jsonl:
-                rec, lbl = parse_and_label_jsonl(line)
-                if not rec: # 파싱 실패 시 건너뛰기
-                    continue
-            else: # 기존 .log, .json 파일 처리
-                path, query = parse_line(line)
-                if not path and not query:
-                    continue
-                rec = (path or "") + (('?' + query) if query else '')
-                lbl = rule_based_label(path, query)
-
-            all_texts.append(rec)
-            all_labels.append(lbl)
-
-    if not all_texts:
-        print("❌ 모든 파일에서 유효한 로그를 파싱하지 못했습니다. 학습을 중단합니다.")
-        sys.exit(1)
+        cache_meta = read_feature_cache_meta(fp, config_key) if use_cache else None
+        if cache_meta is not None:
+            plans.append((fp, cache_meta, None, []))
+            continue
+        meta = feature_cache_meta(fp, config_key) if use_cache else None
+        plans.append((fp, None, meta, split_file_ranges(fp, -(-os.path.getsize(fp) // INGEST_CHUNK_BYTES), INGEST_CHUNK_BYTES // 2)))
+    results = _iter_chunk_results([(fp, a, b) for fp, _, _, ranges in plans for a, b in ranges], jobs)
 
-    print(f"✅ 총 {len(all_texts):,}개의 로그 항목 라벨링 완료")
-    
-    MAX_SAMPLES_FOR_TRAINING = 200_000 
-    n_total = len(all_texts)
-    
-    if n_total > MAX_SAMPLES_FOR_TRAINING:
-        print(f"\n🧠 (메모리 최적화) 전체 {n_total:,}개 중 {MAX_SAMPLES_FOR_TRAINING:,}개만 무작위로 샘플링하여 학습을 진행합니다...")
-        sample_indices = np.random.choice(n_total, MAX_SAMPLES_FOR_TRAINING, replace=False)
-        texts_to_train = [all_texts[i] for i in sample_indices]
-        labels_to_train = [all_labels[i] for i in sample_indices]
-    else:
-        print("\n🧠 (전체 데이터 사용) 데이터 양이 충분하여 전체 데이터를 사용하여 학습을 진행합니다...")
-        texts_to_train = all_texts
-        labels_to_train = all_labels
-    
-    print("📊 샘플링된 데이터 레이블 분포:"); print(pd.Series(labels_to_train).value_counts().to_string())
-    
-    print("\n🔡 벡터화 중(HashingVectorizer: char_wb 3~5-gram)...")
-    X = vec.transform(texts_to_train); y = np.array(labels_to_train)
+    for fp, cache_meta, meta, ranges in plans:
+        cached = cache_meta is not None
+        if verbose: print(f"  - 처리 중: {os.path.basename(fp)}{' (특성 캐시)' if cached else ''}")
+        if cached:
+            stats = Counter(cache_meta["stats"])
+            stats["seconds"] = 0.0
+            yield from iter_feature_cache(fp, cache_meta, stats)
+        else:
+            stats, writer = Counter(), FeatureCacheWriter(fp, meta) if use_cache else None
+            for _ in ranges:
+                X, codes, buckets, chunk_stats = next(results)
+                stats.update(chunk_stats)
+                if writer is not None: writer.add(X, codes, buckets)
+                yield X, codes, buckets
+            if writer is not None: writer.finish(stats)
+        if verbose: print_file_stats(fp, stats)
 
-    print("💪 기본 모델(SGDClassifier) 학습...")
-    base_clf = SGDClassifier(loss='log_loss', max_iter=1000, tol=1e-3).fit(X, y)
-    joblib.dump(base_clf, BASE_MODEL_PATH); print(f"  - 모델 저장: {BASE_MODEL_PATH}")
+class ReservoirSampler:
+    """길이를 모르는 스트림에서 최대 k개를 균등 무작위 추출 (Algorithm L, 메모리 O(k)).
+    교체할 위치까지 건너뛸 개수를 미리 뽑으므로 난수 생성은 O(k·log(n/k))회뿐이다."""
+    def __init__(self, k, rng=None):
+        self.k, self.rng = k, rng or random.Random()
+        self.items, self.seen = [], 0
+        self._w = 1.0
+        self._next = k
+        if k > 0: self._advance()
 
-    print("🎯 확률 보정(CalibratedClassifierCV)...")
-    vc = pd.Series(y)
-    min_samples = 0
-    if not vc.empty:
-      class_counts = vc.value_counts()
-      if not class_counts.empty:
-        min_samples = class_counts.min()
+    def _advance(self):
+        self._w *= math.exp(math.log(1.0 - self.rng.random()) / self.k)
+        self._next += int(math.log(1.0 - self.rng.random()) / math.log1p(-self._w)) + 1 if self._w < 1.0 else 1
+
+    def add_batch(self, n, get):
+        """다음 n개 항목을 처리. get(i)는 표본으로 뽑힌 i번째 항목만 만들 때 호출된다."""
+        base = self.seen
+        while len(self.items) < self.k and self.seen < base + n:
+            self.items.append(get(self.seen - base))
+            self.seen += 1
+        while self.k > 0 and self._next <= base + n:
+            self.items[self.rng.randrange(self.k)] = get(self._next - 1 - base)
+            self._advance()
+        self.seen = base + n
+
+    def add(self, item):
+        self.add_batch(1, lambda _: item)
+
+def _csr_row(X, codes, i):
+    a, b = X.indptr[i], X.indptr[i + 1]
+    return X.indices[a:b].copy(), X.data[a:b].copy(), codes[i]
+
+def rows_to_matrix(rows):
+    """표본 행 목록 [(indices, data, 라벨 코드)] → (CSR X, 라벨 y)"""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(r[0]) for r in rows], out=indptr[1:])
+    indices = np.concatenate([r[0] for r in rows]) if rows else np.empty(0, dtype=np.int32)
+    data = np.concatenate([r[1] for r in rows]) if rows else np.empty(0)
+    X = sp.csr_matrix((data, indices, indptr), shape=(len(rows), vec.n_features))
+    return X, CLASSES[np.array([r[2] for r in rows], dtype=np.uint8)]
+
+def print_label_counts(labels):
+    print(pd.Series(labels).value_counts().to_string())
+
+# ========= 모델 학습 =========
+def calibrate(base_clf, X, y, prefit=False):
+    """시그모이드 확률 보정. 클래스 샘플이 부족하면 기본 모델을 그대로 반환.
+    prefit=True면 base_clf(이미 학습됨)를 고정한 채 X, y는 보정에만 사용한다."""
+    class_counts = pd.Series(y).value_counts()
+    min_samples = int(class_counts.min()) if not class_counts.empty else 0
+    if prefit and len(class_counts) < len(base_clf.classes_):
+        min_samples = 0   # 보정 세트에 없는 클래스가 있으면 고정 모델의 클래스와 맞지 않음
 
     if min_samples < 2:
         print(f"⚠️ 일부 클래스 샘플 부족(min={min_samples}) → 보정 생략, 기본 모델로 대체 저장")
-        joblib.dump(base_clf, CAL_MODEL_PATH)
-    else:
-        cv_folds = min(max(2, int(min_samples)), 5)
-        print(f"  - 자동 설정 cv={cv_folds}")
-        cal_clf = CalibratedClassifierCV(base_clf, method='sigmoid', cv=cv_folds).fit(X, y)
-        joblib.dump(cal_clf, CAL_MODEL_PATH)
-    print(f"  - 보정(또는 대체) 모델 저장: {CAL_MODEL_PATH}")
+        return base_clf
+    cv_folds = min(max(2, min_samples), 5)
+    print(f"  - 자동 설정 cv={cv_folds}")
+    if not prefit:
+        return CalibratedClassifierCV(base_clf, method='sigmoid', cv=cv_folds).fit(X, y)
+    try:
+        from sklearn.frozen import FrozenEstimator   # sklearn >= 1.6
+        return CalibratedClassifierCV(FrozenEstimator(base_clf), method='sigmoid', cv=cv_folds).fit(X, y)
+    except ImportError:
+        return CalibratedClassifierCV(base_clf, method='sigmoid', cv='prefit').fit(X, y)
 
-    print("🌲 IsolationForest(이상치 탐지) 학습...")
+def fit_anomaly_model(X):
     n_components = min(50, X.shape[1] - 1 if X.shape[1] > 1 else 1)
     svd = TruncatedSVD(n_components=n_components, random_state=42)
     X_red = svd.fit_transform(X)
     iforest = IsolationForest(n_estimators=50, contamination=0.01, random_state=42).fit(X_red)
-    joblib.dump((iforest, svd), IFOREST_MODEL_PATH); print(f"  - 이상치 모델 저장: {IFOREST_MODEL_PATH}")
+    return iforest, svd
+
+def train_in_memory(log_files, max_samples=MAX_SAMPLES_FOR_TRAINING, seed=None, jobs=1, use_cache=True):
+    """최대 max_samples개 행을 저장소 샘플링으로 뽑아 메모리에서 학습 (전체 로그를 메모리에 쌓지 않음)"""
+    print("🔡 파싱/라벨링/벡터화(HashingVectorizer: char_wb 3~5-gram)...")
+    sampler = ReservoirSampler(max_samples, random.Random(seed))
+    for X, codes, _ in iter_feature_chunks(log_files, jobs, use_cache):
+        sampler.add_batch(X.shape[0], lambda i: _csr_row(X, codes, i))
+    if not sampler.items:
+        return None
+    n_total = sampler.seen
+    print(f"✅ 총 {n_total:,}개의 로그 항목 라벨링 완료")
+    if n_total > max_samples:
+        print(f"\n🧠 (메모리 최적화) 전체 {n_total:,}개 중 {max_samples:,}개만 무작위로 샘플링하여 학습을 진행합니다...")
+    else:
+        print("\n🧠 (전체 데이터 사용) 데이터 양이 충분하여 전체 데이터를 사용하여 학습을 진행합니다...")
+    X, y = rows_to_matrix(sampler.items)
+    sampler.items = []
+
+    print("📊 샘플링된 데이터 레이블 분포:"); print_label_counts(y)
+
+    print("💪 기본 모델(SGDClassifier) 학습...")
+    base_clf = SGDClassifier(loss='log_loss', max_iter=1000, tol=1e-3, random_state=seed).fit(X, y)
+
+    print("🎯 확률 보정(CalibratedClassifierCV)...")
+    cal_clf = calibrate(base_clf, X, y)
+
+    print("🌲 IsolationForest(이상치 탐지) 학습...")
+    return base_clf, cal_clf, fit_anomaly_model(X)
+
+def train_streaming(log_files, epochs=1, batch_size=STREAM_BATCH_SIZE, max_samples=MAX_SAMPLES_FOR_TRAINING,
+                    seed=None, jobs=1, use_cache=True):
+    """전체 로그를 미니배치로 흘려 SGDClassifier.partial_fit으로 학습 (메모리는 배치 + 샘플 크기로 고정).
+    확률 보정은 학습에서 제외한 홀드아웃의 저장소 샘플로, IsolationForest는 전체의 저장소 샘플로 학습한다."""
+    base_clf = SGDClassifier(loss='log_loss', tol=1e-3, random_state=seed)
+    rng = random.Random(seed)
+    cal_sampler, if_sampler = ReservoirSampler(max_samples, rng), ReservoirSampler(max_samples, rng)
+    label_counts, n_trained = np.zeros(len(CLASSES), dtype=np.int64), 0
+
+    for epoch in range(epochs):
+        first = epoch == 0
+        if epochs > 1: print(f"\n💪 [epoch {epoch + 1}/{epochs}] SGDClassifier.partial_fit (배치 {batch_size:,})...")
+        for X, codes, buckets in iter_feature_chunks(log_files, jobs, use_cache, verbose=first):
+            if first:
+                label_counts += np.bincount(codes, minlength=len(CLASSES))
+                if_sampler.add_batch(X.shape[0], lambda i: _csr_row(X, codes, i))
+                holdout = np.flatnonzero(buckets < CALIBRATION_HOLDOUT_PCT)
+                cal_sampler.add_batch(len(holdout), lambda j: _csr_row(X, codes, holdout[j]))
+            for s in range(0, X.shape[0], batch_size):
+                train_rows = s + np.flatnonzero(buckets[s:s + batch_size] >= CALIBRATION_HOLDOUT_PCT)
+                if not len(train_rows): continue
+                base_clf.partial_fit(X[train_rows], CLASSES[codes[train_rows]], classes=CLASSES)
+                if first: n_trained += len(train_rows)
+        if n_trained == 0: break
+
+    if not label_counts.sum():
+        return None
+    if n_trained == 0:
+        print("❌ 홀드아웃을 제외하고 학습할 데이터가 없습니다. 로그를 더 추가하세요.")
+        return None
+    print(f"✅ 총 {int(label_counts.sum()):,}개 항목 스트리밍 학습 완료 (SGD 학습 {n_trained:,}개 × {epochs} epoch)")
+    print("📊 전체 데이터 레이블 분포:")
+    print(pd.Series(label_counts, index=CLASSES).loc[lambda c: c > 0].sort_values(ascending=False).to_string())
+
+    print(f"\n🎯 확률 보정(CalibratedClassifierCV, 홀드아웃 샘플 {len(cal_sampler.items):,}/{cal_sampler.seen:,}개)...")
+    X_cal, y_cal = rows_to_matrix(cal_sampler.items)
+    cal_sampler.items = []
+    cal_clf = calibrate(base_clf, X_cal, y_cal, prefit=True)
+
+    print(f"🌲 IsolationForest(이상치 탐지) 학습 (샘플 {len(if_sampler.items):,}/{if_sampler.seen:,}개)...")
+    X_if, _ = rows_to_matrix(if_sampler.items)
+    if_sampler.items = []
+    return base_clf, cal_clf, fit_anomaly_model(X_if)
+
+# ========= 모델 번들 =========
+# asdfg.py가 sklearn 추정기 없이 np.load(mmap_mode='r')로 올리는 평면 배열 형식 (model_bundle/).
+#   meta.json                      클래스, 보정 폴드 구성, IsolationForest 상수, 배열 목록, 내용 해시
+#   coef_t.npy / intercept.npy     보정 폴드별 SGD 가중치를 열 방향으로 이어 붙인 것 (n_features, 폴드 수 × 출력 수)
+#   sigmoid_a.npy / sigmoid_b.npy  열별 시그모이드 보정 계수 (p = 1 / (1 + exp(a·f + b)))
+#   class_idx.npy                  열별 대상 클래스 인덱스
+#   svd_components_t.npy           TruncatedSVD.components_.T
+#   tree_*.npy                     IsolationForest 트리들을 이어 붙인 노드 배열 (리프는 자기 자신을 가리킴)
+# 가중치는 (n_features, k) 행 우선으로 저장하므로 희소 X @ W가 복사 없이 계산되고, mmap으로는 등장한 특성의 행만 읽힌다.
+MODEL_BUNDLE_FORMAT = 1
+
+def _average_path_length(n):
+    """n개 샘플 iTree의 평균 경로 길이 (sklearn.ensemble._iforest._average_path_length와 동일)"""
+    n = np.asarray(n, dtype=np.float64)
+    apl = np.zeros_like(n)
+    apl[n == 2] = 1.0
+    big = n > 2
+    apl[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return apl
+
+def _node_depths(t):
+    """루트 깊이 1 기준 노드 깊이 (Tree.compute_node_depths와 동일)"""
+    depth = np.zeros(t.node_count, dtype=np.float64)
+    depth[0] = 1.0
+    for node in range(t.node_count):   # 자식 노드 번호는 항상 부모보다 큼
+        if t.children_left[node] != -1:
+            depth[t.children_left[node]] = depth[t.children_right[node]] = depth[node] + 1.0
+    return depth
+
+def _classifier_bundle(cal_clf):
+    classes = cal_clf.classes_
+    n_classes = len(classes)
+    if isinstance(cal_clf, CalibratedClassifierCV):
+        if cal_clf.method != 'sigmoid':
+            raise ValueError(f"시그모이드 보정만 지원합니다 (method={cal_clf.method})")
+        kind, parts = "calibrated", []
+        for cc in cal_clf.calibrated_classifiers_:
+            est = getattr(cc.estimator, "estimator", cc.estimator)   # FrozenEstimator → SGDClassifier
+            class_idx = np.searchsorted(classes, est.classes_)[:est.coef_.shape[0]] + (1 if n_classes == 2 else 0)
+            parts.append((est, class_idx, [c.a_ for c in cc.calibrators], [c.b_ for c in cc.calibrators]))
+    else:   # 보정 생략 시 저장되는 SGDClassifier
+        kind = "linear"
+        parts = [(cal_clf, np.arange(cal_clf.coef_.shape[0]) + (1 if n_classes == 2 else 0), None, None)]
+
+    folds, pos = [], 0
+    for est, _, _, _ in parts:
+        folds.append([pos, pos + est.coef_.shape[0]])
+        pos += est.coef_.shape[0]
+    arrays = {
+        "coef_t": np.ascontiguousarray(np.vstack([est.coef_ for est, _, _, _ in parts]).T, dtype=np.float64),
+        "intercept": np.concatenate([est.intercept_ for est, _, _, _ in parts]).astype(np.float64),
+        "class_idx": np.concatenate([idx for _, idx, _, _ in parts]).astype(np.int64),
+    }
+    if kind == "calibrated":
+        arrays["sigmoid_a"] = np.concatenate([a for _, _, a, _ in parts]).astype(np.float64)
+        arrays["sigmoid_b"] = np.concatenate([b for _, _, _, b in parts]).astype(np.float64)
+    return {"kind": kind, "classes": [str(c) for c in classes], "folds": folds}, arrays
+
+def _iforest_bundle(iforest):
+    subsample = iforest._max_features != iforest.n_features_in_   # 이때만 트리가 특성 부분집합으로 학습됨
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset, n_steps = 0, 0
+    for tree, features in zip(iforest.estimators_, iforest.estimators_features_):
+        t = tree.tree_
+        ids = np.arange(t.node_count)
+        leaf = t.children_left == -1
+        depth = _node_depths(t)
+        feat = np.where(leaf, 0, t.feature)
+        feature.append(np.asarray(features)[feat] if subsample else feat)
+        threshold.append(np.where(leaf, np.inf, t.threshold))
+        left.append(np.where(leaf, ids, t.children_left) + offset)
+        right.append(np.where(leaf, ids, t.children_right) + offset)
+        # 리프 값 = 깊이 + 남은 샘플의 평균 경로 길이 - 1.0 (sklearn _parallel_compute_tree_depths와 같은 식)
+        value.append(depth + _average_path_length(t.n_node_samples) - 1.0)
+        roots.append(offset)
+        offset += t.node_count
+        n_steps = max(n_steps, int(depth.max()) - 1)
+    arrays = {"tree_feature": np.concatenate(feature).astype(np.int64), "tree_threshold": np.concatenate(threshold),
+              "tree_left": np.concatenate(left).astype(np.int64), "tree_right": np.concatenate(right).astype(np.int64),
+              "tree_value": np.concatenate(value), "tree_roots": np.array(roots, dtype=np.int64)}
+    denominator = len(iforest.estimators_) * float(_average_path_length([iforest.max_samples_])[0])
+    return {"offset": float(iforest.offset_), "denominator": denominator, "n_steps": n_steps}, arrays
+
+def export_model_bundle(cal_clf, anomaly_model, path=MODEL_BUNDLE_DIR):
+    iforest, svd = anomaly_model
+    clf_meta, arrays = _classifier_bundle(cal_clf)
+    if_meta, if_arrays = _iforest_bundle(iforest)
+    arrays.update(if_arrays)
+    arrays["svd_components_t"] = np.ascontiguousarray(svd.components_.T, dtype=np.float64)
+
+    tmp = f"{path}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    h = hashlib.sha256()
+    for name in sorted(arrays):
+        np.save(os.path.join(tmp, f"{name}.npy"), arrays[name])
+        h.update(name.encode('utf-8')); h.update(arrays[name].tobytes())
+    meta = {"format": MODEL_BUNDLE_FORMAT, "n_features": vec.n_features, "classifier": clf_meta, "iforest": if_meta,
+            "arrays": sorted(arrays), "content_sha256": h.hexdigest(), "created": datetime.now().isoformat(timespec='seconds')}
+    with open(os.path.join(tmp, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    # 기존 번들 교체 (분석 중인 프로세스의 mmap은 삭제된 이전 파일을 계속 참조하므로 안전)
+    old = f"{path}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path): os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+def save_models(base_clf, cal_clf, anomaly_model):
+    # asdfg.py는 번들이 있으면 번들을 우선 쓰므로, 새 pkl을 쓰기 전에 이전 번들부터 지운다.
+    # (번들 생성이 실패하거나 중간에 중단돼도 이전 가중치가 아니라 새 pkl로 분석하도록)
+    shutil.rmtree(MODEL_BUNDLE_DIR, ignore_errors=True)
+    joblib.dump(base_clf, BASE_MODEL_PATH); print(f"  - 모델 저장: {BASE_MODEL_PATH}")
+    joblib.dump(cal_clf, CAL_MODEL_PATH); print(f"  - 보정(또는 대체) 모델 저장: {CAL_MODEL_PATH}")
+    joblib.dump(anomaly_model, IFOREST_MODEL_PATH); print(f"  - 이상치 모델 저장: {IFOREST_MODEL_PATH}")
+    try:
+        export_model_bundle(cal_clf, anomaly_model); print(f"  - 모델 번들 저장: {MODEL_BUNDLE_DIR}")
+    except Exception as e:
+        shutil.rmtree(f"{MODEL_BUNDLE_DIR}.tmp", ignore_errors=True)
+        shutil.rmtree(MODEL_BUNDLE_DIR, ignore_errors=True)
+        print(f"⚠️ 모델 번들을 만들 수 없어 pkl 모델만 저장: {type(e).__name__}: {e}")
+
+# ========= 학습 파이프라인 =========
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="웹 로그 취약점(SQLi/XSS) 분류/이상치 모델 학습")
+    parser.add_argument("--stream", action="store_true",
+                        help="전체 로그를 미니배치 partial_fit으로 학습 (메모리 사용량이 로그 크기와 무관)")
+    parser.add_argument("--epochs", type=int, default=1, help="스트리밍 모드에서 로그 전체를 반복 학습할 횟수 (기본 1)")
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE,
+                        help=f"스트리밍 모드의 partial_fit 배치 크기 (기본 {STREAM_BATCH_SIZE:,})")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES_FOR_TRAINING,
+                        help=f"메모리에 올리는 학습/보정/이상치 샘플 최대 개수 (기본 {MAX_SAMPLES_FOR_TRAINING:,})")
+    parser.add_argument("--jobs", type=int, default=1, help="로그 파싱/라벨링을 나눠 처리할 워커 프로세스 수 (기본 1)")
+    parser.add_argument("--no-feature-cache", action="store_true",
+                        help=f"로그 옆의 파일별 특성 캐시(*{FEATURE_CACHE_SUFFIX}/ 디렉터리)를 읽거나 만들지 않음")
+    parser.add_argument("--seed", type=int, help="샘플링/SGD 난수 시드 (지정하면 같은 로그에서 같은 모델이 나옴)")
+    args = parser.parse_args()
+
+    print("🚀 AI 모델 학습을 시작합니다...")
+    
+    log_files = find_log_files()
+
+    if not log_files:
+        print(f"❌ '{LOG_DIR}'에서 처리할 로그 파일을 찾을 수 없습니다. 학습을 중단합니다.")
+        sys.exit(1)
+
+    print(f"📄 총 {len(log_files)}개의 로그 파일을 사용합니다.")
+    if args.stream:
+        models = train_streaming(log_files, max(1, args.epochs), max(1, args.batch_size), args.max_samples,
+                                 args.seed, args.jobs, not args.no_feature_cache)
+    else:
+        models = train_in_memory(log_files, args.max_samples, args.seed, args.jobs, not args.no_feature_cache)
+
+    if models is None:
+        print("❌ 모든 파일에서 유효한 로그를 파싱하지 못했습니다. 학습을 중단합니다.")
+        sys.exit(1)
+
+    save_models(*models)
 
     print("\n✅ 모든 모델 학습 및 저장 완료!")
     print("     • 분류기: sgd_model.pkl, calibrated_model.pkl")
-    print("     • 이상치: iforest_model.pkl (SVD 포함)")
\ No newline at end of file
+    print("     • 이상치: iforest_model.pkl (SVD 포함)")
+    print("     • 분석용 번들: model_bundle/ (asdfg.py가 우선 사용)")
\ No newline at end of file
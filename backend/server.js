@@ -6,6 +6,8 @@ const path = require("path");
 const multer = require("multer");
 const { Client } = require("@elastic/elasticsearch");
 const { spawn } = require('child_process');
+const http = require("http");
+const readline = require("readline");
 
 const app = express();
 // 포트는 80번 사용
@@ -42,6 +44,18 @@ const esClient = new Client({
   },
 });
 
+// asdfg.py가 combined 형식 라인에서 추출하는 접속 정보 필드
+// (형식이 맞지 않는 값 하나 때문에 문서 전체가 거부되지 않도록 ignore_malformed)
+const ACCESS_LOG_FIELD_MAPPINGS = {
+  "client_ip": { "type": "ip", "ignore_malformed": true },
+  "timestamp": { "type": "date", "format": "dd/MMM/yyyy:HH:mm:ss Z", "ignore_malformed": true },
+  "method": { "type": "keyword" },
+  "http_status": { "type": "short", "ignore_malformed": true },
+  "response_bytes": { "type": "long", "ignore_malformed": true },
+  "referer": { "type": "keyword", "ignore_above": 2048 },
+  "user_agent": { "type": "text", "fields": { "keyword": { "type": "keyword", "ignore_above": 512 } } }
+};
+
 // Elasticsearch 연결 확인 함수
 async function checkConnection() {
   try {
@@ -67,7 +81,9 @@ async function checkDocumentCount() {
             "prediction": { "type": "keyword" },
             "original_log": { "type": "text" },
             "url": { "type": "keyword" },
-            "status": { "type": "keyword" }
+            "matched_rules": { "type": "keyword" },
+            "status": { "type": "keyword" },
+            ...ACCESS_LOG_FIELD_MAPPINGS
           }
         }
       });
@@ -100,106 +116,252 @@ const storage = multer.diskStorage({
 });
 const upload = multer({ storage: storage });
 
-// 로그 파일 업로드, 삭제, AI 분석 실행 라우터
-app.post("/upload-log", upload.single("logFile"), async (req, res) => {
-    if (!req.file) { /* ... */ }
+// --- AI 분석 실행 ---
+// ANALYZER_URL(예: http://127.0.0.1:8765) 또는 ANALYZER_SOCKET(Unix 소켓 경로)이 설정되어 있으면
+// 모델이 상주하는 분석 서버(`asdfg.py --serve`)에 요청하고, 없으면 업로드마다 asdfg.py를 실행한다.
+const ANALYZER_URL = process.env.ANALYZER_URL;
+const ANALYZER_SOCKET = process.env.ANALYZER_SOCKET;
+const scriptPath = path.join(__dirname, 'AI/AI/asdfg.py'); // server.js 위치 기준
+const pythonExecutable = '/root/10-23-logx-project/venv/bin/python3'; // 쉘 실행 파일
+
+// 분석 결과를 BULK_BATCH_DOCS 건씩 모아 Elasticsearch에 저장 (전체 결과를 메모리에 쌓지 않음)
+const BULK_BATCH_DOCS = 1000;
+
+function createBulkIndexer(indexName) {
+    let lines = [];
+    let count = 0;
+
+    const flush = async () => {
+        if (lines.length === 0) return;
+        const body = lines.join('\n') + '\n';
+        const docs = lines.length / 2;
+        lines = [];
+        const { body: response } = await esClient.bulk({ body });
+        if (response && response.errors) {
+            console.error("⚠️ /upload-log: 일부 문서 저장 실패 (bulk errors=true)");
+        }
+        count += docs;
+        console.log(`💾 /upload-log: Elasticsearch 벌크 저장 (${count} 건 누적)`);
+    };
+
+    return {
+        // asdfg.py --format bulk 출력 라인(액션/문서)을 그대로 전달
+        async addBulkLine(line) {
+            lines.push(line);
+            if (lines.length >= BULK_BATCH_DOCS * 2) await flush();
+        },
+        async addDoc(doc) {
+            await this.addBulkLine(JSON.stringify({ index: { _index: indexName } }));
+            await this.addBulkLine(JSON.stringify(doc));
+        },
+        async finish() {
+            await flush();
+            await esClient.indices.refresh({ index: indexName });
+            return count;
+        },
+    };
+}
+
+// input: 로그 파일 경로 또는 업로드 스트림(Readable). 스트림이면 asdfg.py의 표준입력("-")으로 흘려보낸다.
+async function analyzeWithSpawn(input, indexer, indexName, { jsonl = false } = {}) {
+    const fromStream = typeof input !== 'string';
+    const pythonArgs = [scriptPath, fromStream ? '-' : input, '--format', 'bulk', '--index', indexName];
+    if (jsonl) pythonArgs.push('--jsonl');
+    console.log(`📜 /upload-log: 스크립트 경로: ${scriptPath}`);
+    console.log(`🐍 /upload-log: 실행될 Shell 명령: ${pythonArgs.slice(1).join(' ')}`); // 실행될 최종 명령 로그
+
+    const pythonProcess = spawn(pythonExecutable, pythonArgs);
+    if (fromStream) {
+        // 업로드 중단 등으로 파이프가 끊겨도 서버가 죽지 않도록 (종료 코드로 실패 처리)
+        pythonProcess.stdin.on('error', (pipeError) => console.error(`⚠️ /upload-log: 표준입력 전달 실패: ${pipeError.message}`));
+        input.on('error', (uploadError) => pythonProcess.stdin.destroy(uploadError));
+        input.pipe(pythonProcess.stdin);
+    }
+
+    let errorOutput = '';
+    pythonProcess.stderr.on('data', (data) => {
+        const errorChunk = data.toString();
+        console.error(`🐍 [stderr]: ${errorChunk}`); // stderr 로그 추가
+        errorOutput += errorChunk;
+    });
+
+    const exited = new Promise((resolve, reject) => {
+        pythonProcess.on('close', resolve);
+        pythonProcess.on('error', (spawnError) => {
+            console.error('❌ /upload-log: Python 프로세스 생성 실패:', spawnError);
+            reject(new Error(`AI 분석 프로세스를 시작할 수 없습니다: ${spawnError.message}`));
+        });
+    });
+    exited.catch(() => {}); // 아래에서 await 하기 전에 reject되어도 경고가 나지 않도록
+
+    // 청크 단위로 flush되는 NDJSON 출력을 한 줄씩 받아 바로 색인
+    const rl = readline.createInterface({ input: pythonProcess.stdout, crlfDelay: Infinity });
     try {
-        console.log("🔄 /upload-log: 요청 수신됨."); // 요청 수신 로그 추가
-        const indexName = 'analyzed-logs';
-        // indices.exists() 반환 값은 boolean이 아닐 수 있으므로 body 확인
-        const existsResponse = await esClient.indices.exists({ index: indexName });
-        const exists = existsResponse.body; // Elasticsearch 8.x 이상
-
-        if (exists) {
-            console.log(`🔄 /upload-log: '${indexName}' 인덱스 존재 확인. 기존 데이터 삭제 시작...`);
-            await esClient.deleteByQuery({
-                index: indexName,
-                body: { query: { match_all: {} } },
-                refresh: true
-            });
-            console.log("✅ /upload-log: 기존 데이터 삭제 완료.");
-        } else {
-            console.log(`ℹ️ /upload-log: '${indexName}' 인덱스가 없어 새로 생성합니다.`);
-             await esClient.indices.create({ 
-                index: indexName,
-                mappings: {
-                 properties: {
-                    "anomaly_score": { "type": "float" },
-                    "prediction": { "type": "keyword" },
-                    "original_log": { "type": "text" },
-                    "url": { "type": "keyword" },
-                    "status": { "type": "keyword" }
-                 }
-                }
-             });
-             console.log(`✅ /upload-log: '${indexName}' 인덱스 생성 완료.`);
+        for await (const line of rl) {
+            if (line) await indexer.addBulkLine(line);
         }
+    } catch (indexError) {
+        // ES 저장 실패 등으로 더 읽지 않으면 자식이 가득 찬 stdout 파이프에서 영원히 멈추므로 종료시킨다
+        pythonProcess.kill();
+        throw indexError;
+    }
 
-        const logFilePath = req.file.path;
-        console.log(`✅ /upload-log: 파일 저장 완료: ${logFilePath}`);
-        console.log("▶ /upload-log: AI 분석 시작...");
+    const code = await exited;
+    console.log(`🐍 /upload-log: Python 스크립트 종료 코드: ${code}`);
+    if (code !== 0) {
+        throw new Error(errorOutput || `스크립트 실행 중 오류 발생 (종료 코드: ${code})`);
+    }
+}
 
-        // [확인 완료] Python 가상 환경 경로 및 스크립트 경로 정의
-        const scriptPath = path.join(__dirname, 'AI/AI/asdfg.py'); // server.js 위치 기준
+// 분석 서버의 /analyze?format=ndjson 응답을 한 줄씩 받아 바로 색인 (전체 결과를 메모리에 모으지 않음)
+async function analyzeWithDaemon(logFilePath, indexer) {
+    const payload = JSON.stringify({ path: path.resolve(logFilePath) });
+    const target = ANALYZER_SOCKET ? { socketPath: ANALYZER_SOCKET } : (() => {
+        const url = new URL(ANALYZER_URL);
+        return { hostname: url.hostname, port: url.port };
+    })();
+    console.log(`📡 /upload-log: 분석 서버에 요청: ${ANALYZER_SOCKET || ANALYZER_URL}`);
 
-        const pythonExecutable = '/root/10-23-logx-project/venv/bin/python3'; // 쉘 실행 파일
-        const pythonArgs = [scriptPath, logFilePath];
+    const response = await new Promise((resolve, reject) => {
+        const req = http.request({
+            ...target,
+            path: '/analyze?format=ndjson',
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(payload) },
+        }, resolve);
+        req.on('error', (reqError) => reject(new Error(`분석 서버에 연결할 수 없습니다: ${reqError.message}`)));
+        req.end(payload);
+    });
+    response.setEncoding('utf8');
 
-        console.log(`📜 /upload-log: 스크립트 경로: ${scriptPath}`);
-        console.log(`🐍 /upload-log: 실행될 Shell 명령: ${pythonArgs[1]}`); // 실행될 최종 명령 로그
+    if (response.statusCode !== 200) {
+        let body = '';
+        for await (const chunk of response) body += chunk;
+        throw new Error(`분석 서버 오류 (HTTP ${response.statusCode}): ${body}`);
+    }
 
-        const pythonProcess = spawn(pythonExecutable, pythonArgs); 
+    const rl = readline.createInterface({ input: response, crlfDelay: Infinity });
+    try {
+        for await (const line of rl) {
+            if (!line) continue;
+            const doc = JSON.parse(line);
+            if (doc.error !== undefined && doc.original_log === undefined) {
+                throw new Error(`분석 서버 오류: ${doc.error}`); // 전송 중 발생한 오류는 마지막 줄로 온다
+            }
+            await indexer.addDoc(doc);
+        }
+    } catch (streamError) {
+        response.destroy(); // 연결을 끊어 서버가 남은 샤드 분석을 멈추게 한다
+        throw streamError;
+    }
+}
+
+// 업로드마다 분석 결과 인덱스를 비우거나(있으면) 새로 생성
+const ANALYZED_INDEX = 'analyzed-logs';
 
-        let analysisResult = '';
-        let errorOutput = '';
+async function resetAnalyzedIndex(indexName) {
+    // indices.exists() 반환 값은 boolean이 아닐 수 있으므로 body 확인
+    const existsResponse = await esClient.indices.exists({ index: indexName });
+    const exists = existsResponse.body; // Elasticsearch 8.x 이상
 
-        pythonProcess.stdout.on('data', (data) => {
-            const outputChunk = data.toString();
-            console.log(`🐍 [stdout]: ${outputChunk}`); // stdout 로그 추가
-            analysisResult += outputChunk;
+    if (exists) {
+        console.log(`🔄 /upload-log: '${indexName}' 인덱스 존재 확인. 기존 데이터 삭제 시작...`);
+        await esClient.deleteByQuery({
+            index: indexName,
+            body: { query: { match_all: {} } },
+            refresh: true
         });
-        pythonProcess.stderr.on('data', (data) => {
-            const errorChunk = data.toString();
-            console.error(`🐍 [stderr]: ${errorChunk}`); // stderr 로그 추가
-            errorOutput += errorChunk;
+        console.log("✅ /upload-log: 기존 데이터 삭제 완료.");
+    } else {
+        console.log(`ℹ️ /upload-log: '${indexName}' 인덱스가 없어 새로 생성합니다.`);
+         await esClient.indices.create({ 
+            index: indexName,
+            mappings: {
+             properties: {
+                "anomaly_score": { "type": "float" },
+                "prediction": { "type": "keyword" },
+                "original_log": { "type": "text" },
+                "url": { "type": "keyword" },
+                "matched_rules": { "type": "keyword" },
+                "status": { "type": "keyword" },
+                ...ACCESS_LOG_FIELD_MAPPINGS
+             }
+            }
+         });
+         console.log(`✅ /upload-log: '${indexName}' 인덱스 생성 완료.`);
+    }
+}
+
+// ANALYZER_STDIN=1이면 (분석 서버 미사용 시) 업로드 파일을 디스크에 저장하지 않고
+// 받는 즉시 asdfg.py 표준입력으로 흘려보낸다. .gz/.zst 업로드도 그대로 전달 (압축 해제는 asdfg.py가 처리).
+const ANALYZER_STDIN = process.env.ANALYZER_STDIN === '1' && !(ANALYZER_URL || ANALYZER_SOCKET);
+
+const streamingStorage = {
+    _handleFile(req, file, cb) {
+        (async () => {
+            console.log(`🔄 /upload-log: 스트리밍 분석 시작: ${file.originalname}`);
+            await resetAnalyzedIndex(ANALYZED_INDEX);
+            const indexer = createBulkIndexer(ANALYZED_INDEX);
+            const jsonl = /\.jsonl(\.gz|\.zst)?$/i.test(file.originalname);
+            await analyzeWithSpawn(file.stream, indexer, ANALYZED_INDEX, { jsonl });
+            return { streamed: true, count: await indexer.finish() };
+        })().then((info) => cb(null, info), (streamError) => {
+            file.stream.resume(); // 남은 업로드 본문을 버려 요청이 끝나도록
+            cb(streamError);
         });
+    },
+    _removeFile(req, file, cb) { cb(null); },
+};
 
-        pythonProcess.on('close', async (code) => {
-            console.log(`🐍 /upload-log: Python 스크립트 종료 코드: ${code}`);
-            if (code !== 0) {
-                console.error(`❌ /upload-log: AI 분석 스크립트 오류 (종료 코드: ${code})`, errorOutput);
-                return res.status(500).json({ message: "AI 분석 실패", error: errorOutput || "스크립트 실행 중 오류 발생" });
-            }
-            try {
-                console.log("✅ /upload-log: AI 분석 완료. 결과 파싱 및 Elasticsearch 저장 시작...");
-                console.log("🐍 /upload-log: Python Raw Output (before parse):", analysisResult); // 파싱 전 원본 출력 확인
-
-                const results = JSON.parse(analysisResult);
-                if (!Array.isArray(results)) {
-                    console.error("❌ /upload-log: 분석 결과가 JSON 배열 형식이 아님");
-                    throw new Error("분석 결과가 JSON 배열 형식이 아닙니다.");
-                }
-
-                if (results.length > 0) {
-                    const body = results.flatMap(doc => [{ index: { _index: 'analyzed-logs' } }, doc]);
-                    console.log(`💾 /upload-log: Elasticsearch 벌크 저장 시도 (${results.length} 건)`);
-                    await esClient.bulk({ refresh: true, body });
-                    console.log("💾 /upload-log: Elasticsearch 벌크 저장 완료.");
-                } else {
-                    console.log("ℹ️ /upload-log: 분석 결과 데이터 없음. Elasticsearch 저장 생략.");
-                }
-                console.log("🎉 /upload-log: 모든 작업 완료!");
-                res.status(200).json({ message: "분석 및 저장 성공", data: results });
-            } catch (e) {
-                console.error("❌ /upload-log: 분석 결과 파싱 또는 ES 저장 중 오류 발생", e);
-                res.status(500).json({ message: "결과 처리 실패", error: e.message, rawOutput: analysisResult });
+const streamUpload = multer({ storage: streamingStorage }).single("logFile");
+const uploadLog = ANALYZER_STDIN
+    ? (req, res, next) => streamUpload(req, res, (streamError) => {
+        if (!streamError) return next();
+        console.error("❌ /upload-log: 스트리밍 분석 또는 ES 저장 중 오류 발생", streamError.message);
+        res.status(500).json({ message: "AI 분석 실패", error: streamError.message || "스크립트 실행 중 오류 발생" });
+    })
+    : upload.single("logFile");
+
+// 로그 파일 업로드, 삭제, AI 분석 실행 라우터
+app.post("/upload-log", uploadLog, async (req, res) => {
+    if (!req.file) { /* ... */ }
+    if (req.file.streamed) {
+        // 스트리밍 모드: 저장소 엔진에서 분석·색인까지 끝남
+        if (req.file.count === 0) console.log("ℹ️ /upload-log: 분석 결과 데이터 없음.");
+        console.log("🎉 /upload-log: 모든 작업 완료!");
+        return res.status(200).json({ message: "분석 및 저장 성공", count: req.file.count });
+    }
+    try {
+        console.log("🔄 /upload-log: 요청 수신됨."); // 요청 수신 로그 추가
+        await resetAnalyzedIndex(ANALYZED_INDEX);
+
+        const logFilePath = req.file.path;
+        console.log(`✅ /upload-log: 파일 저장 완료: ${logFilePath}`);
+        console.log("▶ /upload-log: AI 분석 시작...");
+
+        const indexer = createBulkIndexer(ANALYZED_INDEX);
+        try {
+            if (ANALYZER_URL || ANALYZER_SOCKET) {
+                await analyzeWithDaemon(logFilePath, indexer);
+            } else {
+                await analyzeWithSpawn(logFilePath, indexer, ANALYZED_INDEX);
             }
-        });
+        } catch (analysisError) {
+            console.error("❌ /upload-log: AI 분석 또는 ES 저장 중 오류 발생", analysisError.message);
+            return res.status(500).json({ message: "AI 분석 실패", error: analysisError.message || "스크립트 실행 중 오류 발생" });
+        }
 
-         pythonProcess.on('error', (spawnError) => {
-             console.error('❌ /upload-log: Python 프로세스 생성 실패:', spawnError);
-             res.status(500).json({ message: "AI 분석 프로세스를 시작할 수 없습니다.", error: spawnError.message });
-         });
+        try {
+            const count = await indexer.finish();
+            if (count === 0) {
+                console.log("ℹ️ /upload-log: 분석 결과 데이터 없음.");
+            }
+            console.log("🎉 /upload-log: 모든 작업 완료!");
+            res.status(200).json({ message: "분석 및 저장 성공", count });
+        } catch (e) {
+            console.error("❌ /upload-log: Elasticsearch 저장 중 오류 발생", e);
+            res.status(500).json({ message: "결과 처리 실패", error: e.message });
+        }
 
     } catch (err) {
         console.error("❌ /upload-log: 파일 처리 또는 ES 데이터 삭제 중 오류 발생:", err);